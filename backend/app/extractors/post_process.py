@@ -114,7 +114,6 @@ _RE_REF_RCS    = re.compile(r"(RCS[A-Z0-9]+-\d{5}-\d{6}-\d{7,})", re.IGNORECASE)
 _RE_REF_TTSTH  = re.compile(r"(TTSTH\d{10,})", re.IGNORECASE)
 _RE_REF_THMPTI = re.compile(r"(THMPTI\d{16,})", re.IGNORECASE)
 
-_RE_ALL_WS = re.compile(r"\s+")
 
 
 def extract_reference_from_filename(filename: str) -> str:
@@ -131,10 +130,10 @@ def extract_reference_from_filename(filename: str) -> str:
     for rx in (_RE_REF_TRS, _RE_REF_RCS, _RE_REF_TTSTH, _RE_REF_THMPTI):
         m = rx.search(stem)
         if m:
-            return _RE_ALL_WS.sub("", m.group(1))
+            return "".join(m.group(1).split())
 
     # fallback: คืน stem ทั้งก้อน (ตัด whitespace)
-    return _RE_ALL_WS.sub("", stem)
+    return "".join(stem.split())
 
 
 def infer_doc_date_from_reference(ref: str) -> str:
@@ -386,8 +385,8 @@ def post_process_peak_row(
             row["L_description"] = row["U_group"]
 
         # 7) hard rules: whitespace-free C/G (แม้ filename ไม่มีช่องว่าง ก็กันไว้)
-        row["C_reference"] = _RE_ALL_WS.sub("", str(row.get("C_reference", "") or ""))
-        row["G_invoice_no"] = _RE_ALL_WS.sub("", str(row.get("G_invoice_no", "") or ""))
+        row["C_reference"] = "".join(str(row.get("C_reference", "") or "").split())
+        row["G_invoice_no"] = "".join(str(row.get("G_invoice_no", "") or "").split())
 
         # 8) ensure C/G both present if either present
         if not row.get("C_reference") and row.get("G_invoice_no"):
@@ -402,8 +401,8 @@ def post_process_peak_row(
         # fail-safe: never crash, still format
         try:
             row = row or {}
-            row["C_reference"] = _RE_ALL_WS.sub("", str(row.get("C_reference", "") or ""))
-            row["G_invoice_no"] = _RE_ALL_WS.sub("", str(row.get("G_invoice_no", "") or ""))
+            row["C_reference"] = "".join(str(row.get("C_reference", "") or "").split())
+            row["G_invoice_no"] = "".join(str(row.get("G_invoice_no", "") or "").split())
             enforce_amounts(row)
             if not (row.get("U_group") or "").strip():
                 row["U_group"] = "Marketplace Expense"
@@ -14,24 +14,31 @@ Key Fixes & Improvements:
 
 from __future__ import annotations
 
-import csv
-import io
+import codecs
 import re
 import logging
+import math
+import operator
+import os
+import tempfile
+from copy import copy
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
-from typing import List, Dict, Any, Tuple, Optional, Set
+from functools import lru_cache
+from itertools import chain, islice
+from typing import List, Dict, Any, Tuple, Optional, FrozenSet, Callable, Iterator
 
-from openpyxl import Workbook
-from openpyxl.styles import Alignment, Font, PatternFill, Border, Side, numbers
-from openpyxl.utils import get_column_letter
+try:
+    import xlsxwriter  # type: ignore
+except Exception:  # pragma: no cover
+    xlsxwriter = None  # type: ignore
 
 logger = logging.getLogger(__name__)
 
 # =========================
 # PEAK Schema (A-U)
 # =========================
-COLUMNS: List[Tuple[str, str]] = [
+COLUMNS: Tuple[Tuple[str, str], ...] = (
     ("A_seq", "ลำดับที่*"),
     ("A_company_name", "ชื่อบริษัท"),
     ("B_doc_date", "วันที่เอกสาร"),
@@ -54,16 +61,20 @@ COLUMNS: List[Tuple[str, str]] = [
     ("S_pnd", "ภ.ง.ด. (ถ้ามี)"),
     ("T_note", "หมายเหตุ"),
     ("U_group", "กลุ่มจัดประเภท"),
-]
+)
 
-COL_KEYS: List[str] = [k for k, _ in COLUMNS]
+COL_KEYS: Tuple[str, ...] = tuple(k for k, _ in COLUMNS)
+COL_LABELS: Tuple[str, ...] = tuple(label for _, label in COLUMNS)
+_LAST_COL_LETTER = chr(ord("A") + len(COLUMNS) - 1)  # single-letter while <= 26 columns
+# all A-U values of a preprocessed row in one call (preprocess fills every key)
+_COL_GETTER = operator.itemgetter(*COL_KEYS)
 
 # =========================
 # Platforms / Rules
 # =========================
-PLATFORMS: Set[str] = {
+PLATFORMS: FrozenSet[str] = frozenset({
     "META", "GOOGLE", "SHOPEE", "LAZADA", "TIKTOK", "SPX", "THAI_TAX", "UNKNOWN"
-}
+})
 
 # Vendor "names" (used as vendor hint/label; actual PEAK column D wants vendor code Cxxxxx in your workflow)
 PLATFORM_VENDOR_NAMES = {
@@ -91,12 +102,17 @@ PLATFORM_VAT_RULES = {
     "UNKNOWN":{"J_price_type": "1", "O_vat_rate": "7%"},
 }
 
-VAT_RATES: Set[str] = {"7%", "NO", ""}
-PRICE_TYPES: Set[str] = {"1", "2", "3", ""}
-PND_ALLOWED: Set[str] = {"", "1", "2", "3", "53"}
+VAT_RATES: FrozenSet[str] = frozenset({"7%", "NO", ""})
+PRICE_TYPES: FrozenSet[str] = frozenset({"1", "2", "3", ""})
+PND_ALLOWED: FrozenSet[str] = frozenset({"", "1", "2", "3", "53"})
+
+# platform -> (J_price_type, O_vat_rate) default, flattened once
+_PLATFORM_VAT_DEFAULTS: Dict[str, Tuple[str, str]] = {
+    p: (r["J_price_type"], r["O_vat_rate"]) for p, r in PLATFORM_VAT_RULES.items()
+}
 
 # Expense groups (your canonical set)
-GROUPS: Set[str] = {
+GROUPS: FrozenSet[str] = frozenset({
     "Marketplace Expense",
     "Advertising Expense",
     "Delivery/Logistics Expense",
@@ -104,7 +120,7 @@ GROUPS: Set[str] = {
     "Inventory/COGS",
     "Other Expense",
     "",
-}
+})
 
 PLATFORM_DEFAULT_GROUP = {
     "META": "Advertising Expense",
@@ -120,7 +136,7 @@ PLATFORM_DEFAULT_GROUP = {
 # =========================
 # Excel / CSV concerns
 # =========================
-TEXT_COL_KEYS: Set[str] = {
+TEXT_COL_KEYS: FrozenSet[str] = frozenset({
     "A_seq",
     "A_company_name",
     "C_reference",
@@ -132,24 +148,29 @@ TEXT_COL_KEYS: Set[str] = {
     "O_vat_rate",
     "S_pnd",
     "Q_payment_method",
-}
+})
 
-NUM_COL_KEYS: Set[str] = {"M_qty", "N_unit_price", "R_paid_amount"}
+NUM_COL_KEYS: FrozenSet[str] = frozenset({"M_qty", "N_unit_price", "R_paid_amount"})
 
-DATE_COL_KEYS: Set[str] = {"B_doc_date", "H_invoice_date", "I_tax_purchase_date"}
+DATE_COL_KEYS: FrozenSet[str] = frozenset({"B_doc_date", "H_invoice_date", "I_tax_purchase_date"})
 
-EXCEL_INJECTION_PREFIXES = ("=", "+", "-", "@")
+EXCEL_INJECTION_PREFIXES: FrozenSet[str] = frozenset("=+-@")
 
 # Regex patterns
-RE_YYYYMMDD = re.compile(r"^\d{8}$")
 RE_YYYY_MM_DD = re.compile(r"^(\d{4})-(\d{2})-(\d{2})$")
 RE_DD_MM_YYYY = re.compile(r"^(\d{2})/(\d{2})/(\d{4})$")
 RE_YYYY_MM_DD_SLASH = re.compile(r"^(\d{4})/(\d{2})/(\d{2})$")
-RE_ALL_WS = re.compile(r"\s+")
 RE_AMOUNT_CLEAN = re.compile(r"[,\s]|฿|THB|บาท", re.IGNORECASE)
 
 MAX_ROWS = 50000
 MAX_CELL_LENGTH = 32767
+XLSX_SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+# openpyxl.styles.numbers values; literal so CSV / xlsxwriter exports never import openpyxl
+FORMAT_TEXT = "@"
+FORMAT_NUMBER_00 = "0.00"
+
+_WRAP_COLS = frozenset({13, 21})  # L_description, T_note
 
 # =========================
 # Optional mappings (your project)
@@ -199,7 +220,7 @@ def _escape_excel_formula(s: str) -> str:
     if not s:
         return s
     try:
-        return ("'" + s) if s[:1] in EXCEL_INJECTION_PREFIXES else s
+        return ("'" + s) if s[0] in EXCEL_INJECTION_PREFIXES else s
     except Exception:
         return s
 
@@ -208,17 +229,22 @@ def _compact_no_ws(v: Any) -> str:
     s = _s(v)
     if not s:
         return ""
-    try:
-        return RE_ALL_WS.sub("", s)
-    except Exception:
+    # str.split() uses the same Unicode whitespace set as \s (NBSP etc. included)
+    return "".join(s.split())
+
+
+def _digits_only(s: str) -> str:
+    # fast path: already-clean ids (the common case after extractors) skip the per-char filter
+    if s.isdigit():
         return s
+    return "".join(c for c in s if c.isdigit())
 
 
 def _to_tax13(v: Any) -> str:
     s = _s(v)
     if not s:
         return ""
-    digits = "".join(c for c in s if c.isdigit())
+    digits = _digits_only(s)
     return digits[:13] if len(digits) >= 13 else ""
 
 
@@ -226,7 +252,7 @@ def _to_branch5(v: Any) -> str:
     s = _s(v)
     if not s:
         return "00000"
-    digits = "".join(c for c in s if c.isdigit())
+    digits = _digits_only(s)
     if not digits:
         return "00000"
     return digits.zfill(5)[:5]
@@ -239,7 +265,8 @@ def _parse_date_to_yyyymmdd(date_str: Any) -> str:
     if not s:
         return ""
     try:
-        if RE_YYYYMMDD.match(s):
+        # same as ^\d{8}$ (isdecimal == \d for str) without the regex engine
+        if len(s) == 8 and s.isdecimal():
             return s
 
         m = RE_YYYY_MM_DD.match(s)
@@ -278,6 +305,10 @@ def _parse_amount(amount_str: Any) -> str:
     if not s:
         return ""
     try:
+        # plain ASCII "123" / "123.4" / "123.45": nothing to clean or round, only re-pad
+        ip, _dot, fp = s.partition(".")
+        if ip.isdigit() and ip.isascii() and len(fp) <= 2 and (not fp or (fp.isdigit() and fp.isascii())):
+            return f"{ip.lstrip('0') or '0'}.{fp.ljust(2, '0')}"
         # keep minus? For your use case: expenses are positive; if negative, return ""
         cleaned = RE_AMOUNT_CLEAN.sub("", s).strip()
         if cleaned.startswith("(") and cleaned.endswith(")"):
@@ -291,7 +322,29 @@ def _parse_amount(amount_str: Any) -> str:
         return ""
 
 
-def _clamp_choice(v: Any, allowed: Set[str], fallback: str) -> str:
+def _parse_amount_float(amount_str: Any) -> Optional[float]:
+    """
+    Float variant of _parse_amount for XLSX numeric cells.
+    Plain "1234.5" / "1234.50" (<= 2 decimals) go straight to float(); anything
+    else (more decimals, separators, currency) takes the Decimal path so the
+    2dp rounding matches the CSV output.
+    """
+    s = _s(amount_str)
+    if not s:
+        return None
+    ip, _dot, fp = s.partition(".")
+    if ip.isdigit() and ip.isascii() and len(fp) <= 2 and (not fp or (fp.isdigit() and fp.isascii())):
+        return float(s)
+    parsed = _parse_amount(s)
+    if not parsed:
+        return None
+    f = float(parsed)
+    if not math.isfinite(f):
+        return None
+    return f
+
+
+def _clamp_choice(v: Any, allowed: FrozenSet[str], fallback: str) -> str:
     s = _s(v)
     return s if s in allowed else fallback
 
@@ -324,40 +377,9 @@ def _detect_platform(row: Dict[str, Any]) -> str:
         if p in PLATFORMS:
             return p
 
-        route = _s(row.get("_route_name")).lower()
-        if "meta" in route:
-            return "META"
-        if "google" in route:
-            return "GOOGLE"
-        if "spx" in route or "shopee_express" in route or "shopee-express" in route:
-            return "SPX"
-        if "shopee" in route:
-            return "SHOPEE"
-        if "lazada" in route:
-            return "LAZADA"
-        if "tiktok" in route:
-            return "TIKTOK"
-        if "thai" in route and "tax" in route:
-            return "THAI_TAX"
-
-        vendor = _s(row.get("D_vendor_code")).lower()
-        # if already a Cxxxxx code → can't infer platform from it reliably
-        if vendor.startswith("c") and vendor[1:].isdigit():
-            # try fallback from other fields
-            pass
-        else:
-            if "meta" in vendor or "facebook" in vendor or "instagram" in vendor:
-                return "META"
-            if "google" in vendor:
-                return "GOOGLE"
-            if "shopee express" in vendor or "spx" in vendor:
-                return "SPX"
-            if "shopee" in vendor or "ช้อปปี้" in vendor or "ช็อปปี้" in vendor:
-                return "SHOPEE"
-            if "lazada" in vendor or "ลาซาด้า" in vendor:
-                return "LAZADA"
-            if "tiktok" in vendor or "ติ๊กต๊อก" in vendor:
-                return "TIKTOK"
+        p = _platform_from_hints(_s(row.get("_route_name")).lower(), _s(row.get("D_vendor_code")).lower())
+        if p:
+            return p
 
         # If looks like Thai tax invoice (has tax id 13 + invoice no)
         tax13 = _to_tax13(row.get("E_tax_id_13"))
@@ -370,14 +392,56 @@ def _detect_platform(row: Dict[str, Any]) -> str:
         return "UNKNOWN"
 
 
+@lru_cache(maxsize=1024)
+def _platform_from_hints(route: str, vendor: str) -> str:
+    """
+    Substring rules on (route, vendor) — both already lowercased.
+    Cached: a batch repeats only a handful of distinct route/vendor pairs,
+    so N rows cost ~N dict hits instead of N x (up to 15) substring scans.
+    Returns "" when nothing matches.
+    """
+    if "meta" in route:
+        return "META"
+    if "google" in route:
+        return "GOOGLE"
+    if "spx" in route or "shopee_express" in route or "shopee-express" in route:
+        return "SPX"
+    if "shopee" in route:
+        return "SHOPEE"
+    if "lazada" in route:
+        return "LAZADA"
+    if "tiktok" in route:
+        return "TIKTOK"
+    if "thai" in route and "tax" in route:
+        return "THAI_TAX"
+
+    # if already a Cxxxxx code → can't infer platform from it reliably
+    if vendor.startswith("c") and vendor[1:].isdigit():
+        return ""
+
+    if "meta" in vendor or "facebook" in vendor or "instagram" in vendor:
+        return "META"
+    if "google" in vendor:
+        return "GOOGLE"
+    if "shopee express" in vendor or "spx" in vendor:
+        return "SPX"
+    if "shopee" in vendor or "ช้อปปี้" in vendor or "ช็อปปี้" in vendor:
+        return "SHOPEE"
+    if "lazada" in vendor or "ลาซาด้า" in vendor:
+        return "LAZADA"
+    if "tiktok" in vendor or "ติ๊กต๊อก" in vendor:
+        return "TIKTOK"
+    return ""
+
+
 # =========================
 # Platform enforcement
 # =========================
 def _enforce_platform_rules(rr: Dict[str, Any], platform: str) -> None:
     # VAT rules
-    rules = PLATFORM_VAT_RULES.get(platform) or PLATFORM_VAT_RULES["UNKNOWN"]
-    rr["J_price_type"] = _clamp_choice(rr.get("J_price_type"), PRICE_TYPES, rules["J_price_type"])
-    rr["O_vat_rate"] = _clamp_choice(rr.get("O_vat_rate"), VAT_RATES, rules["O_vat_rate"])
+    jp_default, vat_default = _PLATFORM_VAT_DEFAULTS.get(platform) or _PLATFORM_VAT_DEFAULTS["UNKNOWN"]
+    rr["J_price_type"] = _clamp_choice(rr.get("J_price_type"), PRICE_TYPES, jp_default)
+    rr["O_vat_rate"] = _clamp_choice(rr.get("O_vat_rate"), VAT_RATES, vat_default)
 
     # Default group (ensure it is a group, not platform code)
     ug = _s(rr.get("U_group"))
@@ -483,7 +547,13 @@ def _platform_validation_notes(rr: Dict[str, Any], platform: str) -> None:
 # =========================
 # Preprocess
 # =========================
-def _preprocess_rows_for_export(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def _preprocess_rows_for_export(
+    rows: List[Dict[str, Any]],
+    summary: Optional[Dict[str, Any]] = None,
+    *,
+    in_place: bool = False,
+) -> List[Dict[str, Any]]:
+    # in_place=True mutates the input dicts (exporters own their rows after validation)
     out: List[Dict[str, Any]] = []
     seq = 1
 
@@ -491,7 +561,7 @@ def _preprocess_rows_for_export(rows: List[Dict[str, Any]]) -> List[Dict[str, An
 
     for idx, r in enumerate(rows or [], start=1):
         try:
-            rr = dict(r or {})
+            rr = r if (in_place and r is not None) else dict(r or {})
 
             # 1) detect platform
             platform = _detect_platform(rr)
@@ -537,8 +607,9 @@ def _preprocess_rows_for_export(rows: List[Dict[str, Any]]) -> List[Dict[str, An
                     rr[key] = ""
 
             # 10) clamp vat / price_type / pnd
-            rr["O_vat_rate"] = _clamp_choice(rr.get("O_vat_rate"), VAT_RATES, PLATFORM_VAT_RULES.get(platform, PLATFORM_VAT_RULES["UNKNOWN"])["O_vat_rate"])
-            rr["J_price_type"] = _clamp_choice(rr.get("J_price_type"), PRICE_TYPES, PLATFORM_VAT_RULES.get(platform, PLATFORM_VAT_RULES["UNKNOWN"])["J_price_type"])
+            jp_default, vat_default = _PLATFORM_VAT_DEFAULTS.get(platform) or _PLATFORM_VAT_DEFAULTS["UNKNOWN"]
+            rr["O_vat_rate"] = _clamp_choice(rr.get("O_vat_rate"), VAT_RATES, vat_default)
+            rr["J_price_type"] = _clamp_choice(rr.get("J_price_type"), PRICE_TYPES, jp_default)
             rr["S_pnd"] = _clamp_choice(rr.get("S_pnd"), PND_ALLOWED, "")
 
             # 11) mapping: vendor code Cxxxxx (สำคัญ)
@@ -557,6 +628,15 @@ def _preprocess_rows_for_export(rows: List[Dict[str, Any]]) -> List[Dict[str, An
             if not _s(rr.get("L_description")):
                 rr["L_description"] = rr.get("U_group") or PLATFORM_DEFAULT_GROUP.get(platform, "Other Expense")
 
+            # 16) fused summary (optional): reuse the values parsed above
+            if summary is not None:
+                _summary_add(summary, rr, platform, rr["B_doc_date"], rr["R_paid_amount"])
+
+            # 17) every column present -> exporters read rows via _COL_GETTER
+            for k in COL_KEYS:
+                if k not in rr:
+                    rr[k] = ""
+
             out.append(rr)
 
         except Exception as e:
@@ -593,96 +673,129 @@ def validate_rows(rows: List[Dict[str, Any]]) -> Tuple[bool, List[str]]:
 # =========================
 # Type Conversion
 # =========================
+def _cell_text(s: str, _fmt: str = FORMAT_TEXT) -> Tuple[Any, str]:
+    return (_escape_excel_formula(s), _fmt)
+
+
+def _cell_money(s: str, _fmt: str = FORMAT_NUMBER_00) -> Tuple[Any, str]:
+    f = _parse_amount_float(s)
+    if f is None:
+        return _cell_text(s)
+    return (f, _fmt)
+
+
+def _cell_qty(s: str, _fmt: str = FORMAT_NUMBER_00) -> Tuple[Any, str]:
+    f = _parse_amount_float(s)
+    if f is None:
+        return _cell_text(s)
+    if abs(f - int(f)) < 1e-9:
+        return (int(f), "0")
+    return (f, _fmt)
+
+
+# key -> typed cell handler, resolved once instead of set checks per cell
+_CELL_HANDLERS: Dict[str, Callable[[str], Tuple[Any, str]]] = {
+    k: (_cell_qty if k == "M_qty" else _cell_money if k in NUM_COL_KEYS else _cell_text)
+    for k in COL_KEYS
+}
+_EMPTY_TEXT_CELL: Tuple[Any, str] = ("", FORMAT_TEXT)
+# same handlers in column order, zipped against _COL_GETTER(row)
+_COL_HANDLERS: Tuple[Callable[[str], Tuple[Any, str]], ...] = tuple(_CELL_HANDLERS[k] for k in COL_KEYS)
+
+
 def _to_number_or_text(key: str, raw: Any) -> Tuple[Any, str]:
     try:
-        s = _s(raw)
-
-        # Always text
-        if key in TEXT_COL_KEYS or key in DATE_COL_KEYS:
-            return (_escape_excel_formula(s), numbers.FORMAT_TEXT)
-
-        # Numeric fields
-        if key in NUM_COL_KEYS:
-            if key == "M_qty":
-                parsed = _parse_amount(s)
-                if parsed:
-                    try:
-                        f = float(parsed)
-                        if abs(f - int(f)) < 1e-9:
-                            return (int(f), "0")
-                        return (f, numbers.FORMAT_NUMBER_00)
-                    except Exception:
-                        pass
-                return (_escape_excel_formula(s), numbers.FORMAT_TEXT)
-
-            parsed = _parse_amount(s)
-            if parsed:
-                try:
-                    return (float(parsed), numbers.FORMAT_NUMBER_00)
-                except Exception:
-                    pass
-            return (_escape_excel_formula(s), numbers.FORMAT_TEXT)
-
-        return (_escape_excel_formula(s), numbers.FORMAT_TEXT)
+        return _CELL_HANDLERS.get(key, _cell_text)(_s(raw))
     except Exception:
-        return ("", numbers.FORMAT_TEXT)
+        return _EMPTY_TEXT_CELL
 
 
 # =========================
 # Auto-fit Columns
 # =========================
-def _auto_fit_columns(ws, max_width: int = 60, min_width: int = 10) -> None:
+_WIDTH_SAMPLE_ROWS = 100
+
+
+def _typed_cells(r: Dict[str, Any], raws: Optional[Tuple[Any, ...]] = None) -> List[Tuple[Any, str]]:
+    if raws is None:
+        raws = _COL_GETTER(r)
     try:
-        for col_idx, (_key, label) in enumerate(COLUMNS, start=1):
-            col_letter = get_column_letter(col_idx)
-            max_len = len(str(label))
-
-            max_check = min(ws.max_row + 1, 102)
-            for row_idx in range(2, max_check):
-                try:
-                    v = ws.cell(row=row_idx, column=col_idx).value
-                    if v is None:
-                        continue
-                    s = str(v)
-                    if "\n" in s:
-                        s = s.split("\n", 1)[0]
-                    max_len = max(max_len, len(s))
-                except Exception:
-                    continue
-
-            ws.column_dimensions[col_letter].width = int(min(max(max_len + 2, min_width), max_width))
-    except Exception as e:
-        logger.error(f"Auto-fit columns error: {e}")
+        return [h(_s(raw)) for h, raw in zip(_COL_HANDLERS, raws)]
+    except Exception:
+        # per-cell guard only when some handler raised
+        return [_to_number_or_text(k, raw) for k, raw in zip(COL_KEYS, raws)]
+
+
+def _typed_head_and_widths(
+    rows: List[Dict[str, Any]], max_width: int = 60, min_width: int = 10
+) -> Tuple[List[List[Tuple[Any, str]]], List[int]]:
+    """Convert the first 100 rows once and size columns from them (first line only)."""
+    max_lens = [len(label) for label in COL_LABELS]
+    head: List[List[Tuple[Any, str]]] = []
+    for r in rows[:_WIDTH_SAMPLE_ROWS]:
+        raws = _COL_GETTER(r)
+        typed = _typed_cells(r, raws)
+        for i, (v, _fmt) in enumerate(typed):
+            # text cells already hold the escaped string; numbers are measured as exported text
+            txt = v if isinstance(v, str) else _escape_excel_formula(_s(raws[i]))
+            n = txt.find("\n")
+            n = len(txt) if n < 0 else n
+            if n > max_lens[i]:
+                max_lens[i] = n
+        head.append(typed)
+    widths = [int(min(max(n + 2, min_width), max_width)) for n in max_lens]
+    return head, widths
 
 
 # =========================
 # CSV Export
 # =========================
-def export_rows_to_csv_bytes(rows: List[Dict[str, Any]]) -> bytes:
-    try:
-        logger.info(f"Starting CSV export for {len(rows)} rows")
+def _csv_field(s: str) -> str:
+    if '"' in s:
+        return '"' + s.replace('"', '""') + '"'
+    if "," in s or "\n" in s or "\r" in s:
+        return '"' + s + '"'
+    return s
 
-        is_valid, errors = validate_rows(rows)
-        if not is_valid:
-            raise ExportValidationError("; ".join(errors))
 
-        rows2 = _preprocess_rows_for_export(rows)
-        if not rows2:
-            raise ExportValidationError("No valid rows after preprocessing")
+def _csv_line(fields: List[str]) -> bytes:
+    return (",".join([_csv_field(f) for f in fields]) + "\r\n").encode("utf-8")
 
-        out = io.StringIO()
-        wri = csv.writer(out, quoting=csv.QUOTE_MINIMAL)
 
-        wri.writerow([label for _k, label in COLUMNS])
+CSV_STREAM_CHUNK_ROWS = 500
 
-        for r in rows2:
-            row_out: List[str] = []
-            for k, _label in COLUMNS:
-                s = _escape_excel_formula(_s(r.get(k, "")))
-                row_out.append(s)
-            wri.writerow(row_out)
 
-        result = out.getvalue().encode("utf-8-sig")
+def _csv_chunks(rows2: List[Dict[str, Any]]) -> Iterator[bytes]:
+    # csv.QUOTE_MINIMAL rules, \r\n rows, BOM once; ~CSV_STREAM_CHUNK_ROWS rows per chunk
+    yield codecs.BOM_UTF8 + _csv_line(COL_LABELS)
+    for i in range(0, len(rows2), CSV_STREAM_CHUNK_ROWS):
+        yield b"".join([
+            _csv_line([_escape_excel_formula(_s(v)) for v in _COL_GETTER(r)])
+            for r in islice(rows2, i, i + CSV_STREAM_CHUNK_ROWS)
+        ])
+
+
+def export_rows_to_csv_stream(rows: List[Dict[str, Any]]) -> Iterator[bytes]:
+    """
+    Validate + preprocess now (errors raise here), then yield the CSV in chunks
+    (e.g. for a StreamingResponse) instead of building the whole file.
+    """
+    logger.info(f"Starting CSV export for {len(rows)} rows")
+
+    is_valid, errors = validate_rows(rows)
+    if not is_valid:
+        raise ExportValidationError("; ".join(errors))
+
+    rows2 = _preprocess_rows_for_export(rows, in_place=True)
+    if not rows2:
+        raise ExportValidationError("No valid rows after preprocessing")
+
+    return _csv_chunks(rows2)
+
+
+def export_rows_to_csv_bytes(rows: List[Dict[str, Any]]) -> bytes:
+    try:
+        result = b"".join(export_rows_to_csv_stream(rows))
         logger.info(f"✅ CSV export complete: {len(result)} bytes")
         return result
 
@@ -696,6 +809,145 @@ def export_rows_to_csv_bytes(rows: List[Dict[str, Any]]) -> bytes:
 # =========================
 # XLSX Export
 # =========================
+def _use_xlsxwriter() -> bool:
+    # EXPORT_XLSX_BACKEND=openpyxl forces the old DOM writer
+    if xlsxwriter is None:
+        return False
+    return os.getenv("EXPORT_XLSX_BACKEND", "").strip().lower() != "openpyxl"
+
+
+@lru_cache(maxsize=1)
+def _openpyxl_styles() -> Tuple[Any, ...]:
+    """Shared style instances (openpyxl style objects are immutable), built on first use."""
+    from openpyxl.styles import Alignment, Font, PatternFill, Border, Side
+
+    thin = Side(style="thin", color="D0D7E2")
+    return (
+        PatternFill("solid", fgColor="E8F1FF"),
+        Font(bold=True),
+        Alignment(vertical="center", horizontal="center", wrap_text=True),
+        Border(left=thin, right=thin, top=thin, bottom=thin),
+        Alignment(vertical="top", wrap_text=True),
+        Alignment(vertical="top", wrap_text=False),
+    )
+
+
+def _xlsx_bytes_openpyxl(rows2: List[Dict[str, Any]]) -> bytes:
+    # imported here: the xlsxwriter / CSV paths never pay for openpyxl
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+
+    header_fill, header_font, header_align, border, align_wrap, align_nowrap = _openpyxl_styles()
+
+    # write-only workbook: rows stream to disk instead of growing a cell DOM
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("PEAK_IMPORT")
+
+    ws.freeze_panes = "A2"
+    ws.auto_filter.ref = f"A1:{_LAST_COL_LETTER}1"
+
+    # write-only sheets emit <cols> on the first append -> size from the head rows first
+    head, widths = _typed_head_and_widths(rows2)
+    for col_idx, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = width
+
+    header: List[WriteOnlyCell] = []
+    for label in COL_LABELS:
+        c = WriteOnlyCell(ws, value=label)
+        c.fill = header_fill
+        c.font = header_font
+        c.alignment = header_align
+        c.border = border
+        header.append(c)
+    ws.append(header)
+
+    # (col_idx, number_format) -> registered style ids; assigning the shared
+    # Alignment/Border per cell still hashes them into the workbook tables
+    styles: Dict[Tuple[int, str], Any] = {}
+
+    def _style(col_idx: int, fmt: str):
+        key = (col_idx, fmt)
+        st = styles.get(key)
+        if st is None:
+            tmpl = WriteOnlyCell(ws)
+            if fmt:
+                tmpl.number_format = fmt
+            tmpl.alignment = align_wrap if col_idx in _WRAP_COLS else align_nowrap
+            tmpl.border = border
+            st = styles[key] = tmpl._style
+        return st
+
+    # TEXT/DATE columns get FORMAT_TEXT from _to_number_or_text in the row loop
+    for typed in chain(head, map(_typed_cells, islice(rows2, len(head), None))):
+        cells: List[WriteOnlyCell] = []
+        for col_idx, (v, fmt) in enumerate(typed, start=1):
+            cell = WriteOnlyCell(ws, value=v if v != "" else None)
+            cell._style = copy(_style(col_idx, fmt))
+            cells.append(cell)
+        ws.append(cells)
+
+    # spill to disk past 8MB so large exports don't hold the zip twice in RAM
+    with tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_MAX_BYTES) as f:
+        wb.save(f)
+        f.seek(0)
+        return f.read()
+
+
+def _xlsx_bytes_xlsxwriter(rows2: List[Dict[str, Any]]) -> bytes:
+    """Same sheet as the openpyxl path, streamed row by row (constant_memory)."""
+    with tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_MAX_BYTES) as f:
+        wb = xlsxwriter.Workbook(f, {"constant_memory": True, "strings_to_numbers": False})
+        ws = wb.add_worksheet("PEAK_IMPORT")
+
+        border = {"border": 1, "border_color": "#D0D7E2"}
+        header_fmt = wb.add_format({
+            **border,
+            "bold": True,
+            "bg_color": "#E8F1FF",
+            "align": "center",
+            "valign": "vcenter",
+            "text_wrap": True,
+        })
+        # (number_format, wrap) -> Format, built once per workbook
+        cell_fmts: Dict[Tuple[str, bool], Any] = {}
+
+        def _fmt(num_fmt: str, wrap: bool):
+            key = (num_fmt, wrap)
+            fm = cell_fmts.get(key)
+            if fm is None:
+                props: Dict[str, Any] = {**border, "valign": "top", "text_wrap": wrap}
+                if num_fmt:
+                    props["num_format"] = num_fmt
+                fm = cell_fmts[key] = wb.add_format(props)
+            return fm
+
+        head, widths = _typed_head_and_widths(rows2)
+        for col, width in enumerate(widths):
+            ws.set_column(col, col, width)
+
+        for col, label in enumerate(COL_LABELS):
+            ws.write_string(0, col, label, header_fmt)
+
+        typed_rows = chain(head, map(_typed_cells, islice(rows2, len(head), None)))
+        for row_num, typed in enumerate(typed_rows, start=1):
+            for col, (v, num_fmt) in enumerate(typed):
+                fm = _fmt(num_fmt, col + 1 in _WRAP_COLS)
+                if v == "":
+                    ws.write_blank(row_num, col, None, fm)
+                elif isinstance(v, str):
+                    ws.write_string(row_num, col, v, fm)
+                else:
+                    ws.write_number(row_num, col, v, fm)
+
+        ws.freeze_panes(1, 0)
+        ws.autofilter(0, 0, 0, len(COLUMNS) - 1)
+
+        wb.close()
+        f.seek(0)
+        return f.read()
+
+
 def export_rows_to_xlsx_bytes(rows: List[Dict[str, Any]]) -> bytes:
     try:
         logger.info(f"Starting XLSX export for {len(rows)} rows")
@@ -704,69 +956,14 @@ def export_rows_to_xlsx_bytes(rows: List[Dict[str, Any]]) -> bytes:
         if not is_valid:
             raise ExportValidationError("; ".join(errors))
 
-        rows2 = _preprocess_rows_for_export(rows)
+        rows2 = _preprocess_rows_for_export(rows, in_place=True)
         if not rows2:
             raise ExportValidationError("No valid rows after preprocessing")
 
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "PEAK_IMPORT"
-
-        headers = [label for _k, label in COLUMNS]
-        ws.append(headers)
-
-        header_fill = PatternFill("solid", fgColor="E8F1FF")
-        header_font = Font(bold=True)
-        header_align = Alignment(vertical="center", horizontal="center", wrap_text=True)
-
-        thin = Side(style="thin", color="D0D7E2")
-        border = Border(left=thin, right=thin, top=thin, bottom=thin)
-
-        for col_idx in range(1, len(COLUMNS) + 1):
-            c = ws.cell(row=1, column=col_idx)
-            c.fill = header_fill
-            c.font = header_font
-            c.alignment = header_align
-            c.border = border
-
-        for _row_num, r in enumerate(rows2, start=2):
-            values: List[Any] = []
-            formats: List[str] = []
-
-            for k, _label in COLUMNS:
-                v, fmt = _to_number_or_text(k, r.get(k, ""))
-                values.append(v)
-                formats.append(fmt)
-
-            ws.append(values)
-
-            current_row = ws.max_row
-            for col_idx, fmt in enumerate(formats, start=1):
-                cell = ws.cell(row=current_row, column=col_idx)
-                if fmt:
-                    cell.number_format = fmt
-                cell.alignment = Alignment(vertical="top", wrap_text=(col_idx in {13, 21}))
-                cell.border = border
-
-        ws.freeze_panes = "A2"
-        ws.auto_filter.ref = f"A1:{get_column_letter(len(COLUMNS))}1"
-
-        col_index = {k: i + 1 for i, (k, _) in enumerate(COLUMNS)}
-        for key in (TEXT_COL_KEYS | DATE_COL_KEYS):
-            ci = col_index.get(key)
-            if not ci:
-                continue
-            for row_i in range(2, 2 + len(rows2)):
-                try:
-                    ws.cell(row=row_i, column=ci).number_format = numbers.FORMAT_TEXT
-                except Exception:
-                    continue
-
-        _auto_fit_columns(ws)
-
-        bio = io.BytesIO()
-        wb.save(bio)
-        result = bio.getvalue()
+        if _use_xlsxwriter():
+            result = _xlsx_bytes_xlsxwriter(rows2)
+        else:
+            result = _xlsx_bytes_openpyxl(rows2)
         logger.info(f"✅ XLSX export complete: {len(result)} bytes")
         return result
 
@@ -780,45 +977,57 @@ def export_rows_to_xlsx_bytes(rows: List[Dict[str, Any]]) -> bytes:
 # =========================
 # Summary
 # =========================
+def _new_summary(total_rows: int) -> Dict[str, Any]:
+    return {
+        "total_rows": total_rows,
+        "valid_rows": 0,
+        "platforms": {},
+        "extraction_methods": {},
+        "clients": {},
+        "date_range": {"earliest": None, "latest": None},
+        "total_amount": 0.0,
+        "warnings": [],
+    }
+
+
+def _summary_add(summary: Dict[str, Any], row: Dict[str, Any], platform: str, doc_date: str, amt: str) -> None:
+    """Accumulate one row; doc_date/amt must already be normalized (YYYYMMDD / 2dp string)."""
+    if _s(row.get("D_vendor_code")):
+        summary["valid_rows"] += 1
+
+    summary["platforms"][platform] = summary["platforms"].get(platform, 0) + 1
+
+    method = _s(row.get("_extraction_method")) or "unknown"
+    summary["extraction_methods"][method] = summary["extraction_methods"].get(method, 0) + 1
+
+    company = _s(row.get("A_company_name")) or "Unknown"
+    summary["clients"][company] = summary["clients"].get(company, 0) + 1
+
+    if doc_date:
+        if not summary["date_range"]["earliest"] or doc_date < summary["date_range"]["earliest"]:
+            summary["date_range"]["earliest"] = doc_date
+        if not summary["date_range"]["latest"] or doc_date > summary["date_range"]["latest"]:
+            summary["date_range"]["latest"] = doc_date
+
+    if amt:
+        try:
+            summary["total_amount"] += float(amt)
+        except Exception:
+            pass
+
+
 def get_export_summary(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
     try:
-        summary = {
-            "total_rows": len(rows),
-            "valid_rows": 0,
-            "platforms": {},
-            "extraction_methods": {},
-            "clients": {},
-            "date_range": {"earliest": None, "latest": None},
-            "total_amount": 0.0,
-            "warnings": [],
-        }
+        summary = _new_summary(len(rows))
 
         for row in rows or []:
-            if _s(row.get("D_vendor_code")):
-                summary["valid_rows"] += 1
-
-            platform = _detect_platform(row)
-            summary["platforms"][platform] = summary["platforms"].get(platform, 0) + 1
-
-            method = _s(row.get("_extraction_method")) or "unknown"
-            summary["extraction_methods"][method] = summary["extraction_methods"].get(method, 0) + 1
-
-            company = _s(row.get("A_company_name")) or "Unknown"
-            summary["clients"][company] = summary["clients"].get(company, 0) + 1
-
-            doc_date = _parse_date_to_yyyymmdd(row.get("B_doc_date"))
-            if doc_date:
-                if not summary["date_range"]["earliest"] or doc_date < summary["date_range"]["earliest"]:
-                    summary["date_range"]["earliest"] = doc_date
-                if not summary["date_range"]["latest"] or doc_date > summary["date_range"]["latest"]:
-                    summary["date_range"]["latest"] = doc_date
-
-            amt = _parse_amount(row.get("R_paid_amount"))
-            if amt:
-                try:
-                    summary["total_amount"] += float(amt)
-                except Exception:
-                    pass
+            _summary_add(
+                summary,
+                row,
+                _detect_platform(row),
+                _parse_date_to_yyyymmdd(row.get("B_doc_date")),
+                _parse_amount(row.get("R_paid_amount")),
+            )
 
         return summary
     except Exception as e:
@@ -826,12 +1035,24 @@ def get_export_summary(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
         return {"error": str(e)}
 
 
+def preprocess_and_summarize(rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Preprocess + summary in ONE pass over rows (dates/amounts are parsed once).
+    Summary reflects the exported values (after platform rules / amount fallback).
+    """
+    summary = _new_summary(len(rows or []))
+    rows2 = _preprocess_rows_for_export(rows, summary=summary)
+    return rows2, summary
+
+
 __all__ = [
     "COLUMNS",
     "export_rows_to_csv_bytes",
+    "export_rows_to_csv_stream",
     "export_rows_to_xlsx_bytes",
     "ExportValidationError",
     "PlatformValidationError",
     "validate_rows",
     "get_export_summary",
+    "preprocess_and_summarize",
 ]
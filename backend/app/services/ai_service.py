@@ -22,14 +22,35 @@ AI Service - Enhanced Version (Multi-Platform + HARD LOCK rules)
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
 import os
+import random
 import re
 import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from decimal import Decimal, InvalidOperation
-from typing import Any, Dict, Optional, Tuple, Set, List
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple, Set, List, FrozenSet
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx  # ships with the openai SDK; used by the concurrent batch path
+except Exception:  # pragma: no cover
+    httpx = None  # type: ignore
+
+try:
+    import orjson  # optional: faster decode of API bodies / model JSON
+except Exception:  # pragma: no cover
+    orjson = None  # type: ignore
 
 logger = logging.getLogger(__name__)
 
@@ -70,9 +91,9 @@ PLATFORM_VAT_RULES = {
     "UNKNOWN": {"J_price_type": "1", "O_vat_rate": "7%"},
 }
 
-VAT_RATES: Set[str] = {"7%", "NO"}
-PRICE_TYPES: Set[str] = {"1", "2", "3"}
-PND_ALLOWED: Set[str] = {"", "1", "2", "3", "53"}
+VAT_RATES: FrozenSet[str] = frozenset({"7%", "NO"})
+PRICE_TYPES: FrozenSet[str] = frozenset({"1", "2", "3"})
+PND_ALLOWED: FrozenSet[str] = frozenset({"", "1", "2", "3", "53"})
 
 PLATFORM_GROUPS = {
     "META": "Advertising Expense",
@@ -85,20 +106,32 @@ PLATFORM_GROUPS = {
     "UNKNOWN": "Other Expense",
 }
 
-GROUPS: Set[str] = {
+GROUPS: FrozenSet[str] = frozenset({
     "Marketplace Expense",
     "Advertising Expense",
     "Delivery/Logistics Expense",
     "General Expense",
     "Inventory/COGS",
     "Other Expense",
+})
+
+# platform -> (vendor_label, J_price_type, O_vat_rate, group); one lookup per row
+_PLATFORM_TABLE: Dict[str, Tuple[str, str, str, str]] = {
+    p: (
+        PLATFORM_VENDORS.get(p, ""),
+        PLATFORM_VAT_RULES[p]["J_price_type"],
+        PLATFORM_VAT_RULES[p]["O_vat_rate"],
+        PLATFORM_GROUPS.get(p, "Other Expense"),
+    )
+    for p in PLATFORM_VAT_RULES
 }
+_NO_PLATFORM_RULES: Tuple[str, str, str, str] = ("", "", "", "Other Expense")
 
-CLIENT_TAX_IDS: Set[str] = {
+CLIENT_TAX_IDS: FrozenSet[str] = frozenset({
     "0105563022918",  # SHD
     "0105561071873",  # Rabbit
     "0105565027615",  # TopOne
-}
+})
 
 # ---------------------------------------------------------------------
 # HARD-LOCK account mapping (can override by ENV JSON)
@@ -147,7 +180,23 @@ RE_VENDOR_SPX = re.compile(r"(spx\s*express|shopee\s*express|standard\s*express)
 
 RE_THAI_TAX = re.compile(r"(ใบเสร็จรับเงิน|ใบกำกับภาษี|tax\s*invoice|receipt)", re.IGNORECASE)
 
+# detection order matters (SPX before SHOPEE: "shopee express")
+# anchors: lowercase literals every match must contain (see _search_anchored)
+_PLATFORM_PATTERNS: Tuple[Tuple[str, "re.Pattern[str]", Tuple[str, ...]], ...] = (
+    ("META", RE_VENDOR_META, ("meta", "facebook", "fb", "instagram")),
+    ("GOOGLE", RE_VENDOR_GOOGLE, ("google",)),
+    ("SPX", RE_VENDOR_SPX, ("express",)),
+    ("SHOPEE", RE_VENDOR_SHOPEE, ("shopee", "ช็อปปี้", "ช้อปปี้")),
+    ("LAZADA", RE_VENDOR_LAZADA, ("lazada", "ลาซาด้า")),
+    ("TIKTOK", RE_VENDOR_TIKTOK, ("tiktok", "ติ๊กต๊อก")),
+)
+_THAI_TAX_ANCHORS = ("ใบเสร็จรับเงิน", "ใบกำกับภาษี", "invoice", "receipt")
+
 RE_TAX13 = re.compile(r"\b(\d{13})\b")
+# first 13-digit id that is not one of our clients, in a single C-level search
+RE_VENDOR_TAX13 = re.compile(
+    r"\b(?!(?:" + "|".join(sorted(CLIENT_TAX_IDS)) + r")\b)(\d{13})\b"
+) if CLIENT_TAX_IDS else RE_TAX13
 RE_BRANCH5 = re.compile(r"(?:branch|สาขา)\s*[:#]?\s*(\d{5})", re.IGNORECASE)
 RE_INVOICE_NO = re.compile(r"(?:invoice|inv|เลขที่)\s*[:#]?\s*([A-Z0-9\-/]{4,})", re.IGNORECASE)
 
@@ -159,12 +208,20 @@ RE_PAYMENT_TRANSFER = re.compile(r"(โอน|transfer|bank\s*transfer)", re.IGN
 RE_PAYMENT_CARD = re.compile(r"(card|credit\s*card|visa|mastercard)", re.IGNORECASE)
 RE_PAYMENT_CASH = re.compile(r"(cash|เงินสด)", re.IGNORECASE)
 
+_NO_VAT_ANCHORS = ("vat", "ยกเว้นภาษี", "reverse")
+_PAYMENT_PATTERNS: Tuple[Tuple[str, "re.Pattern[str]", Tuple[str, ...]], ...] = (
+    ("หักจากยอดขาย", RE_PAYMENT_DEDUCT, ("หักจากยอดขาย", "deduct")),
+    ("โอน", RE_PAYMENT_TRANSFER, ("โอน", "transfer")),
+    ("CARD", RE_PAYMENT_CARD, ("card", "visa")),
+    ("เงินสด", RE_PAYMENT_CASH, ("cash", "เงินสด")),
+)
+
 RE_WHT_RATE = re.compile(r"(?:อัตรา|rate|ร้อยละ)\s*([0-9]{1,2})\s*%", re.IGNORECASE)
 RE_WHT_ANY = re.compile(r"(withholding|wht|หักภาษี|ณ\s*ที่จ่าย)", re.IGNORECASE)
 RE_PND_HINT = re.compile(r"(ภ\.ง\.ด\.?\s*53|pnd\s*53)", re.IGNORECASE)
 
-RE_DATE_YYYY_MM_DD = re.compile(r"(\d{4})-(\d{2})-(\d{2})")
-RE_DATE_DD_MM_YYYY = re.compile(r"(\d{2})/(\d{2})/(\d{4})")
+RE_SELLER_ID = re.compile(r"\bSeller\s*ID\s*[:#]?\s*(\d{6,20})\b", re.I)
+RE_USERNAME = re.compile(r"\b(?:Username|User\s*Name|Shop)\s*[:#]?\s*([A-Za-z0-9_.-]{2,})\b", re.I)
 
 # ชื่อไฟล์แบบที่คุณย้ำ เช่น ...-251203-...
 RE_FILENAME_YYMMDD = re.compile(r"(?:^|[-_])(\d{2})(\d{2})(\d{2})(?:[-_]|$)")
@@ -184,17 +241,56 @@ def _normalize_text(text: str) -> str:
     if not text:
         return ""
     try:
-        t = str(text).replace("\r\n", "\n").replace("\r", "\n")
-        t = re.sub(r"[\u200b-\u200f\ufeff]", "", t)
-        lines = [re.sub(r"[ \t\f\v]+", " ", ln).strip() for ln in t.split("\n")]
-        return "\n".join(lines).strip()
+        # cached: retries / re-runs of the same document skip the regex passes
+        return _normalize_text_cached(str(text))
     except Exception as e:
         logger.warning("Text normalization error: %s", e)
         return str(text or "")
 
+_RE_ZERO_WIDTH = re.compile(r"[\u200b-\u200f\ufeff]")
+_RE_HSPACE = re.compile(r"[ \t\f\v]+")
+
+@lru_cache(maxsize=16)
+def _normalize_text_cached(text: str) -> str:
+    t = text.replace("\r\n", "\n").replace("\r", "\n")
+    t = _RE_ZERO_WIDTH.sub("", t)
+    # collapse runs over the whole text at once (the class never spans "\n"),
+    # leaving only the C-level str.strip() per line
+    t = _RE_HSPACE.sub(" ", t)
+    return "\n".join([ln.strip() for ln in t.split("\n")]).strip()
+
+# non-ASCII chars that re.IGNORECASE folds onto ASCII letters (İ ı ſ K);
+# str.lower() does not map them to those letters, so literal prefilters skip such text
+_ODD_CASEFOLD = ("\u0130", "\u0131", "\u017f", "\u212a")
+
+@lru_cache(maxsize=16)
+def _lower_for_prefilter(t: str) -> Optional[str]:
+    for ch in _ODD_CASEFOLD:
+        if ch in t:
+            return None
+    return t.lower()
+
+def _search_anchored(pat: "re.Pattern[str]", anchors: Tuple[str, ...], t: str) -> bool:
+    """
+    pat.search(t), skipped when none of the pattern's required literals occur
+    (plain substring scans are far cheaper than an IGNORECASE regex pass).
+    """
+    tl = _lower_for_prefilter(t)
+    if tl is not None and not any(a in tl for a in anchors):
+        return False
+    return pat.search(t) is not None
+
+# ASCII non-digits -> delete; non-ASCII input keeps the per-char isdigit() path (Thai digits etc.)
+_DROP_ASCII_NON_DIGITS = str.maketrans("", "", "".join(chr(c) for c in range(128) if not chr(c).isdigit()))
+
 def _digits_only(v: Any) -> str:
     try:
-        return "".join(c for c in str(v or "") if c.isdigit())
+        s = str(v or "")
+        if s.isdigit():
+            return s
+        if s.isascii():
+            return s.translate(_DROP_ASCII_NON_DIGITS)
+        return "".join(c for c in s if c.isdigit())
     except Exception:
         return ""
 
@@ -215,6 +311,10 @@ def _to_money_2(v: Any) -> str:
         s = str(v).strip()
         if not s:
             return ""
+        # plain ASCII "123" / "123.4" / "123.45": nothing to round, only re-pad (no Decimal)
+        ip, _dot, fp = s.partition(".")
+        if ip.isdigit() and ip.isascii() and len(fp) <= 2 and (not fp or (fp.isdigit() and fp.isascii())):
+            return f"{ip.lstrip('0') or '0'}.{fp.ljust(2, '0')}"
         s = s.replace("฿", "").replace("THB", "").replace("$", "").replace(",", "").strip()
         d = Decimal(s)
         if d < 0:
@@ -232,7 +332,13 @@ def _money_decimal(v: Any) -> Decimal:
     except Exception:
         return Decimal("0")
 
-def _clamp_choice(v: Any, allowed: Set[str], fallback: str) -> str:
+# zero amounts count as missing (same rule as job_worker._should_call_ai)
+_EMPTY_VALUES = frozenset({"", "0", "0.0", "0.00"})
+
+def _has_value(v: Any) -> bool:
+    return str(v or "").strip() not in _EMPTY_VALUES
+
+def _clamp_choice(v: Any, allowed: FrozenSet[str], fallback: str) -> str:
     try:
         s = "" if v is None else str(v).strip()
         return s if s in allowed else fallback
@@ -246,8 +352,30 @@ def _first_json_object(s: str) -> Optional[str]:
         s = s.strip()
         if s.startswith("{") and s.endswith("}"):
             return s
-        m = re.search(r"\{[\s\S]*\}", s)
-        return m.group(0) if m else None
+        # one pass from the first "{" to its matching "}" (braces inside strings ignored)
+        start = s.find("{")
+        if start < 0:
+            return None
+        depth = 0
+        in_str = esc = False
+        for i in range(start, len(s)):
+            ch = s[i]
+            if in_str:
+                if esc:
+                    esc = False
+                elif ch == "\\":
+                    esc = True
+                elif ch == '"':
+                    in_str = False
+            elif ch == '"':
+                in_str = True
+            elif ch == "{":
+                depth += 1
+            elif ch == "}":
+                depth -= 1
+                if depth == 0:
+                    return s[start:i + 1]
+        return None
     except Exception:
         return None
 
@@ -277,9 +405,8 @@ def _normalize_ref_no_space(s: str) -> str:
     - keep hyphen and slash
     """
     try:
-        x = (s or "").strip()
-        x = re.sub(r"\s+", "", x)
-        return x
+        # str.split() drops exactly the chars \s matches
+        return "".join((s or "").split())
     except Exception:
         return (s or "").strip()
 
@@ -289,88 +416,110 @@ def _build_doc_ref(source_filename: str) -> str:
     """
     return _normalize_ref_no_space(_basename_no_ext(source_filename))
 
-def _detect_platform(text: str, hint: str = "") -> str:
+@lru_cache(maxsize=16)  # keyed on the full OCR text: same bound as _normalize_text_cached
+def _detect_platform(normalized_text: str, hint: str = "") -> str:
     try:
-        t = _normalize_text(text)
         h = (hint or "").strip().upper()
 
         if h in PLATFORM_VENDORS:
             return h
 
-        if RE_VENDOR_META.search(t):
-            return "META"
-        if RE_VENDOR_GOOGLE.search(t):
-            return "GOOGLE"
-        if RE_VENDOR_SPX.search(t):
-            return "SPX"
-        if RE_VENDOR_SHOPEE.search(t):
-            return "SHOPEE"
-        if RE_VENDOR_LAZADA.search(t):
-            return "LAZADA"
-        if RE_VENDOR_TIKTOK.search(t):
-            return "TIKTOK"
-        if RE_THAI_TAX.search(t) and RE_TAX13.search(t):
+        t = normalized_text or ""
+        for name, pat, anchors in _PLATFORM_PATTERNS:
+            if _search_anchored(pat, anchors, t):
+                return name
+        if _search_anchored(RE_THAI_TAX, _THAI_TAX_ANCHORS, t) and RE_TAX13.search(t):
             return "THAI_TAX"
         return "UNKNOWN"
     except Exception as e:
         logger.error("Platform detection error: %s", e)
         return "UNKNOWN"
 
-def _guess_vat(platform: str, text: str) -> Tuple[str, str]:
+def _guess_vat(platform: str, normalized_text: str) -> Tuple[str, str]:
     try:
-        if platform in PLATFORM_VAT_RULES:
-            rules = PLATFORM_VAT_RULES[platform]
-            return rules["J_price_type"], rules["O_vat_rate"]
+        fixed = _PLATFORM_TABLE.get(platform)
+        if fixed:
+            return fixed[1], fixed[2]
 
-        t = _normalize_text(text)
-        if RE_NO_VAT.search(t):
+        # only the NO-VAT hint changes the answer; VAT7 / nothing both give 1, 7%
+        if _search_anchored(RE_NO_VAT, _NO_VAT_ANCHORS, normalized_text or ""):
             return "3", "NO"
-        if RE_HAS_VAT7.search(t):
-            return "1", "7%"
         return "1", "7%"
     except Exception:
         return "1", "7%"
 
-def _guess_payment_method(platform: str, text: str) -> str:
+def _guess_payment_method(platform: str, normalized_text: str) -> str:
     try:
-        t = _normalize_text(text)
         if platform in {"META", "GOOGLE"}:
             return "CARD"
-        if RE_PAYMENT_DEDUCT.search(t):
-            return "หักจากยอดขาย"
-        if RE_PAYMENT_TRANSFER.search(t):
-            return "โอน"
-        if RE_PAYMENT_CARD.search(t):
-            return "CARD"
-        if RE_PAYMENT_CASH.search(t):
-            return "เงินสด"
+        t = normalized_text or ""
+        for method, pat, anchors in _PAYMENT_PATTERNS:
+            if _search_anchored(pat, anchors, t):
+                return method
         return ""
     except Exception:
         return ""
 
-def _guess_vendor_tax_id(text: str) -> str:
+def _guess_vendor_tax_id(normalized_text: str) -> str:
     try:
-        t = _normalize_text(text)
-        for m in RE_TAX13.finditer(t):
-            tax = m.group(1)
-            if tax not in CLIENT_TAX_IDS:
-                return tax
-        return ""
+        m = RE_VENDOR_TAX13.search(normalized_text or "")
+        return m.group(1) if m else ""
     except Exception:
         return ""
 
-def _guess_pnd(text: str, wht: str) -> str:
+def _guess_pnd(normalized_text: str, wht: str) -> str:
     try:
-        t = _normalize_text(text)
+        # any WHT -> 53 (RE_PND_HINT would only confirm it; no text scan needed)
         w = _to_money_2(wht)
         if w and w not in ("0.00", ""):
-            if RE_PND_HINT.search(t):
-                return "53"
             return "53"
         return ""
     except Exception:
         return ""
 
+RE_PAGE_NO_LINE = re.compile(r"^\s*(?:page\s+\d+|หน้า\s*\d+)\s*(?:of\s+\d+|/\s*\d+)?\s*$", re.IGNORECASE)
+# integer / id-only lines; anything with "." or "," may be an amount and is always kept
+RE_INTEGER_LINE = re.compile(r"^[\d\s]+$")
+_TABLE_RUN_MIN = 12  # only long runs of such lines
+
+def _compress_ocr(text: str) -> str:
+    """
+    Shrink the text sent to the LLM (rule-based guesses keep the full text):
+    page-number lines, blank-line runs, and the middle of long integer/id-only
+    runs are dropped; money-like lines (decimals, thousands separators) are
+    never elided. AI_COMPRESS_OCR=0 disables.
+    """
+    if not _env_bool("AI_COMPRESS_OCR", default=True):
+        return _normalize_text(text)
+    try:
+        out: List[str] = []
+        run: List[str] = []
+
+        def _flush_run() -> None:
+            if len(run) >= _TABLE_RUN_MIN:
+                out.extend(run[:3] + [f"...({len(run) - 6} integer lines)..."] + run[-3:])
+            else:
+                out.extend(run)
+            run.clear()
+
+        for ln in _normalize_text(text).split("\n"):
+            if ln and RE_INTEGER_LINE.match(ln):
+                run.append(ln)
+                continue
+            _flush_run()
+            if not ln:
+                if out and out[-1]:
+                    out.append("")
+                continue
+            if RE_PAGE_NO_LINE.match(ln):
+                continue
+            out.append(ln)
+        _flush_run()
+        return "\n".join(out).strip()
+    except Exception as e:
+        logger.warning("OCR compress error: %s", e)
+        return _normalize_text(text)
+
 def _truncate_text_smart(text: str, max_len: int) -> str:
     try:
         t = (text or "").strip()
@@ -385,12 +534,12 @@ def _truncate_text_smart(text: str, max_len: int) -> str:
 # ---------------------------------------------------------------------
 # Amount helpers for HARD RULE: WHT from SUBTOTAL
 # ---------------------------------------------------------------------
-def _extract_wht_rate_from_text(text: str) -> Decimal:
+def _extract_wht_rate_from_text(normalized_text: str) -> Decimal:
     """
-    Find WHT rate like 3% from text. Default 0.
+    Find WHT rate like 3% from (already normalized) text. Default 0.
     """
     try:
-        t = _normalize_text(text)
+        t = normalized_text or ""
         # Strong hint: any wht mention
         if not RE_WHT_ANY.search(t):
             return Decimal("0")
@@ -414,44 +563,288 @@ def _calc_wht_amount_from_subtotal(subtotal: Decimal, rate: Decimal) -> Decimal:
 # ---------------------------------------------------------------------
 # OpenAI API
 # ---------------------------------------------------------------------
-def _openai_chat_json(system: str, user: str, model: str) -> Dict[str, Any]:
-    try:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise RuntimeError("Missing OPENAI_API_KEY")
-
-        base_url = os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1"
-        url = base_url.rstrip("/") + "/chat/completions"
-
-        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-
-        payload: Dict[str, Any] = {
-            "model": model,
-            "temperature": 0,
-            "messages": [
-                {"role": "system", "content": system},
-                {"role": "user", "content": user},
-            ],
-            "response_format": {"type": "json_object"},
-        }
+def _openai_base() -> Tuple[str, str]:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("Missing OPENAI_API_KEY")
+
+    base_url = os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1"
+    return base_url.rstrip("/"), api_key
+
+def _openai_request(system: str, user: str, model: str) -> Tuple[str, Dict[str, str], Dict[str, Any], float]:
+    base_url, api_key = _openai_base()
+    url = base_url + "/chat/completions"
+
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+
+    payload: Dict[str, Any] = {
+        "model": model,
+        "temperature": 0,
+        "messages": [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
+        ],
+        "response_format": {"type": "json_object"},
+    }
+    max_tokens = int(os.getenv("OPENAI_MAX_TOKENS", "0") or "0")
+    if max_tokens > 0:
+        payload["max_tokens"] = max_tokens
+
+    timeout = float(os.getenv("OPENAI_TIMEOUT", "90") or "90")
+    return url, headers, payload, timeout
+
+def _json_loads(s: Any) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(s)
+        except Exception:
+            pass  # stdlib also accepts NaN/Infinity and >64-bit ints
+    return json.loads(s)
 
-        timeout = float(os.getenv("OPENAI_TIMEOUT", "90") or "90")
-        r = requests.post(url, headers=headers, json=payload, timeout=timeout)
-        r.raise_for_status()
-        data = r.json()
+def _json_dumps(obj: Any) -> str:
+    """Compact JSON text for prompt content (orjson when available)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode("utf-8")
+        except Exception:
+            pass  # >64-bit ints, non-str keys, lone surrogates
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+def _json_body(obj: Any) -> bytes:
+    """Request body bytes: one orjson pass instead of requests/httpx re-encoding json=."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except Exception:
+            pass
+    return json.dumps(obj).encode("ascii")
 
+def _parse_chat_json(data: Any) -> Dict[str, Any]:
+    content = ""
+    try:
+        content = data["choices"][0]["message"]["content"]
+    except Exception:
         content = ""
+    return _parse_content_json(content)
+
+def _parse_content_json(content: Any) -> Dict[str, Any]:
+    # response_format=json_object -> content is normally the bare object already
+    if isinstance(content, str):
         try:
-            content = data["choices"][0]["message"]["content"]
+            obj = _json_loads(content)
+            if isinstance(obj, dict):
+                return obj
         except Exception:
-            content = ""
+            pass
+
+    js = _first_json_object(content) or "{}"
+    try:
+        obj = _json_loads(js)
+        return obj if isinstance(obj, dict) else {}
+    except Exception:
+        return {}
+
+OPENAI_RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
 
-        js = _first_json_object(content) or "{}"
+_SESSIONS: Dict[bool, requests.Session] = {}
+
+def _http_session(retry: bool = True) -> requests.Session:
+    """
+    One keep-alive Session per process: later calls reuse the pooled TLS
+    connection instead of a fresh handshake per document.
+    retry=True retries only 429/5xx and connect errors, never read timeouts (a
+    slow completion would be re-sent and billed again); retry=False is for
+    non-idempotent POSTs such as the batch /files and /batches uploads.
+    """
+    sess = _SESSIONS.get(retry)
+    if sess is None:
+        max_retries: Any = 0
+        if retry:
+            max_retries = Retry(
+                total=int(os.getenv("OPENAI_MAX_RETRIES", "3") or "3"),
+                read=0,
+                other=0,
+                backoff_factor=0.5,
+                status_forcelist=sorted(OPENAI_RETRY_STATUS),
+                allowed_methods=frozenset({"GET", "POST"}),
+                raise_on_status=False,
+            )
+        sess = requests.Session()
+        sess.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=max_retries))
+        sess.mount("http://", HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=max_retries))
+        _SESSIONS[retry] = sess
+    return sess
+
+def _read_stream_content(r: requests.Response) -> str:
+    """
+    Join the SSE content deltas of a streamed chat completion, stopping once the
+    root JSON object closes. The empty trailing frames are drained so the pooled
+    connection can be reused; if the model keeps emitting content after the
+    object (e.g. whitespace runs in JSON mode) the response is closed instead.
+    """
+    parts: List[str] = []
+    depth = 0
+    in_str = esc = done = False
+    for line in r.iter_lines():
+        if not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            break
         try:
-            obj = json.loads(js)
-            return obj if isinstance(obj, dict) else {}
+            delta = _json_loads(data)["choices"][0]["delta"].get("content") or ""
         except Exception:
-            return {}
+            continue
+        if done:
+            if delta:
+                r.close()
+                break
+            continue
+        parts.append(delta)
+        for ch in delta:
+            if in_str:
+                if esc:
+                    esc = False
+                elif ch == "\\":
+                    esc = True
+                elif ch == '"':
+                    in_str = False
+            elif ch == '"':
+                in_str = True
+            elif ch == "{":
+                depth += 1
+            elif ch == "}" and depth:
+                depth -= 1
+                if depth == 0:
+                    done = True
+                    break
+    return "".join(parts)
+
+# ---------------------------------------------------------------------
+# Reply cache: identical messages + model -> reuse the parsed reply
+# (re-imports of the same PDF skip the API). AI_CACHE=0 disables;
+# AI_CACHE_DIR adds a persistent SQLite layer behind the in-process LRU.
+# ---------------------------------------------------------------------
+_REPLY_CACHE: "OrderedDict[str, str]" = OrderedDict()
+_REPLY_CACHE_LOCK = threading.Lock()
+
+def _reply_cache_key(system: str, user: str, model: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in (model, system, user):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def _reply_cache_db() -> Optional[sqlite3.Connection]:
+    d = os.getenv("AI_CACHE_DIR")
+    if not d:
+        return None
+    os.makedirs(d, exist_ok=True)
+    con = sqlite3.connect(os.path.join(d, "ai_replies.sqlite3"), timeout=10)
+    con.execute("CREATE TABLE IF NOT EXISTS replies (k TEXT PRIMARY KEY, v TEXT NOT NULL)")
+    return con
+
+def _reply_cache_remember(key: str, raw: str) -> None:
+    size = int(os.getenv("AI_CACHE_SIZE", "512") or "512")
+    with _REPLY_CACHE_LOCK:
+        _REPLY_CACHE[key] = raw
+        _REPLY_CACHE.move_to_end(key)
+        while len(_REPLY_CACHE) > max(0, size):
+            _REPLY_CACHE.popitem(last=False)
+
+def _reply_cache_get(key: str) -> Optional[Dict[str, Any]]:
+    if not _env_bool("AI_CACHE", default=True):
+        return None
+    try:
+        with _REPLY_CACHE_LOCK:
+            raw = _REPLY_CACHE.get(key)
+            if raw is not None:
+                _REPLY_CACHE.move_to_end(key)
+        if raw is None:
+            con = _reply_cache_db()
+            if con is None:
+                return None
+            with closing(con):
+                row = con.execute("SELECT v FROM replies WHERE k = ?", (key,)).fetchone()
+            if not row:
+                return None
+            raw = row[0]
+            _reply_cache_remember(key, raw)
+        return _json_loads(raw)
+    except Exception as e:
+        logger.warning("AI reply cache read error: %s", e)
+        return None
+
+def _reply_cache_put(key: str, out: Dict[str, Any]) -> None:
+    if not out or not _env_bool("AI_CACHE", default=True):
+        return
+    try:
+        raw = _json_dumps(out)
+        _reply_cache_remember(key, raw)
+        con = _reply_cache_db()
+        if con is not None:
+            with closing(con), con:
+                con.execute("INSERT OR REPLACE INTO replies (k, v) VALUES (?, ?)", (key, raw))
+    except Exception as e:
+        logger.warning("AI reply cache write error: %s", e)
+
+def _openai_chat_json(system: str, user: str, model: str) -> Dict[str, Any]:
+    try:
+        key = _reply_cache_key(system, user, model)
+        cached = _reply_cache_get(key)
+        if cached is not None:
+            logger.info("AI reply cache hit")
+            return cached
+
+        url, headers, payload, timeout = _openai_request(system, user, model)
+        if _env_bool("OPENAI_STREAM", default=False):
+            payload["stream"] = True
+            with _http_session().post(url, headers=headers, data=_json_body(payload), timeout=timeout, stream=True) as r:
+                r.raise_for_status()
+                out = _parse_content_json(_read_stream_content(r))
+        else:
+            r = _http_session().post(url, headers=headers, data=_json_body(payload), timeout=timeout)
+            r.raise_for_status()
+            out = _parse_chat_json(_json_loads(r.content))
+        _reply_cache_put(key, out)
+        return out
+
+    except Exception as e:
+        logger.error("OpenAI API error: %s", e)
+        return {}
+
+async def _openai_chat_json_async(client: Any, system: str, user: str, model: str) -> Dict[str, Any]:
+    """
+    Async twin of _openai_chat_json (httpx). Retries 429/5xx with exponential
+    backoff + jitter, honouring Retry-After when the server sends one.
+    """
+    try:
+        key = _reply_cache_key(system, user, model)
+        cached = _reply_cache_get(key)
+        if cached is not None:
+            logger.info("AI reply cache hit")
+            return cached
+
+        url, headers, payload, timeout = _openai_request(system, user, model)
+        retries = int(os.getenv("OPENAI_MAX_RETRIES", "3") or "3")
+
+        body = _json_body(payload)
+        for attempt in range(retries + 1):
+            r = await client.post(url, headers=headers, content=body, timeout=timeout)
+            if r.status_code in OPENAI_RETRY_STATUS and attempt < retries:
+                try:
+                    delay = float(r.headers.get("retry-after") or 0)
+                except ValueError:
+                    delay = 0.0
+                delay = delay or min(30.0, (2 ** attempt) + random.random())
+                logger.warning("OpenAI HTTP %s, retry %d in %.1fs", r.status_code, attempt + 1, delay)
+                await asyncio.sleep(delay)
+                continue
+            r.raise_for_status()
+            out = _parse_chat_json(_json_loads(r.content))
+            _reply_cache_put(key, out)
+            return out
+        return {}
 
     except Exception as e:
         logger.error("OpenAI API error: %s", e)
@@ -460,6 +853,7 @@ def _openai_chat_json(system: str, user: str, model: str) -> Dict[str, Any]:
 # ---------------------------------------------------------------------
 # Platform prompt (with HARD LOCK instructions)
 # ---------------------------------------------------------------------
+@lru_cache(maxsize=None)
 def _build_platform_specific_prompt(platform: str) -> str:
     """
     These are instruction hints; final locking is done in post-processing.
@@ -564,13 +958,13 @@ def _lock_description_pattern(cleaned: Dict[str, Any], platform: str, source_fil
 
     if not seller_id:
         # common patterns: "Seller ID 1234567890"
-        m = re.search(r"\bSeller\s*ID\s*[:#]?\s*(\d{6,20})\b", text, re.I)
+        m = RE_SELLER_ID.search(text)
         if m:
             seller_id = m.group(1).strip()
 
     if not username:
         # weak guess: "Username xxx" / "Shop xxx"
-        m = re.search(r"\b(?:Username|User\s*Name|Shop)\s*[:#]?\s*([A-Za-z0-9_.-]{2,})\b", text, re.I)
+        m = RE_USERNAME.search(text)
         if m:
             username = m.group(1).strip()
 
@@ -622,10 +1016,10 @@ def _guard_dates_not_from_filename(cleaned: Dict[str, Any], source_filename: str
     yyyymmdd = f"20{yymmdd}"
 
     # check if that date appears in doc text (either 20yymmdd or dd/mm/20yy or yyyy-mm-dd)
-    t = _normalize_text(full_text)
+    t = full_text or ""
     appears = (yyyymmdd in t) or (yymmdd in t)
-    appears = appears or bool(re.search(rf"\b{dd}/{mm}/20{yy}\b", t))
-    appears = appears or bool(re.search(rf"\b20{yy}-{mm}-{dd}\b", t))
+    # one scan for both dd/mm/20yy and 20yy-mm-dd
+    appears = appears or bool(re.search(rf"\b(?:{dd}/{mm}/20{yy}|20{yy}-{mm}-{dd})\b", t))
 
     # if not appears -> wipe any matching date fields (only if equals filename date)
     for dk in ("B_doc_date", "H_invoice_date", "I_tax_purchase_date"):
@@ -681,6 +1075,340 @@ def _enforce_wht_from_subtotal(cleaned: Dict[str, Any], full_text: str, partial_
 # ---------------------------------------------------------------------
 # Main AI function
 # ---------------------------------------------------------------------
+AI_BATCH_MAX_DOCS = 8
+AI_BATCH_MAX_CHARS = 60000
+
+_SYSTEM_RULES = (
+    "You are a meticulous Thai accounting document extraction engine for PEAK A–U import.\n"
+    "Return STRICT JSON ONLY (no markdown).\n"
+    "\n"
+    "HARD RULES:\n"
+    "1) NEVER infer any date from filename codes (e.g., 251203). Dates must come from document text.\n"
+    "2) Do NOT put withholding tax (WHT) into unit price.\n"
+    "3) If unsure, leave empty.\n"
+    "4) Money fields: '1234.56' only.\n"
+    "5) Tax ID must be 13 digits (vendor's).\n"
+    "\n"
+)
+
+def _build_schema() -> Dict[str, str]:
+    return {
+        "B_doc_date": "YYYYMMDD (from document only; do NOT use filename codes)",
+        "C_reference": "string <=64 (will be overwritten by hard-lock doc+ref rule)",
+        "D_vendor_code": "string (vendor name/label; final may be overwritten by mapping elsewhere)",
+        "E_tax_id_13": "13 digits or empty (vendor's tax ID, NOT client's)",
+        "F_branch_5": "5 digits (00000 allowed) or empty",
+        "G_invoice_no": "string (will be overwritten by hard-lock doc+ref rule)",
+        "H_invoice_date": "YYYYMMDD (MUST come from document, never from filename)",
+        "I_tax_purchase_date": "YYYYMMDD (optional)",
+        "J_price_type": "1=VAT separated, 2=VAT included, 3=no VAT",
+        "K_account": "string (may be overwritten by client hard-lock mapping)",
+        "L_description": "string (may be overwritten by platform description pattern hard-lock)",
+        "M_qty": "number-as-string (default 1)",
+        "N_unit_price": "money 2dp (do NOT put WHT here)",
+        "O_vat_rate": "7%|NO",
+        "P_wht": "money 2dp (WHT amount; base is SUBTOTAL not TOTAL when provided)",
+        "Q_payment_method": "string",
+        "R_paid_amount": "money 2dp",
+        "S_pnd": "1|2|3|53|empty",
+        "T_note": "string (notes only)",
+        "U_group": f"one of {sorted(GROUPS)}",
+        "_ai_confidence": "0..1",
+        "_ai_notes": "Thai explanation",
+    }
+
+# built once: every row is filtered against the same schema (treat as read-only)
+_SCHEMA: Dict[str, str] = _build_schema()
+
+# byte-identical on every call (rules + schema) so OpenAI prompt caching can reuse
+# the prefix; anything per platform / per document must come after it
+_SYSTEM_PREFIX = (
+    _SYSTEM_RULES
+    + "OUTPUT SCHEMA (JSON keys -> meaning):\n"
+    + json.dumps(_SCHEMA, ensure_ascii=False)
+    + "\n\n"
+)
+
+# schema fields the LLM can fill (metadata keys excluded)
+_GAP_FIELDS = tuple(k for k in _SCHEMA if not k.startswith("_"))
+
+def _gap_fill_fields(partial_row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rule-based values to keep as-is when only a few fields are missing
+    ({} -> full extraction). Opt-in: AI_GAP_FILL_MAX_MISSING=0 (default) disables.
+    Rows that carry _errors (job_worker passes them in partial_row) are never
+    locked: the LLM must be free to fix them.
+    """
+    try:
+        limit = int(os.getenv("AI_GAP_FILL_MAX_MISSING", "0") or "0")
+    except ValueError:
+        limit = 0
+    if limit <= 0 or partial_row.get("_errors"):
+        return {}
+    filled = {k: partial_row[k] for k in _GAP_FIELDS if _has_value(partial_row.get(k))}
+    if len(_GAP_FIELDS) - len(filled) > limit:
+        return {}
+    return filled
+
+def _llm_ready() -> bool:
+    if not _env_bool("ENABLE_LLM", default=False):
+        logger.info("LLM disabled (ENABLE_LLM=0)")
+        return False
+
+    if not os.getenv("OPENAI_API_KEY"):
+        logger.warning("OPENAI_API_KEY not set")
+        return False
+    return True
+
+def _prepare_ai_doc(
+    text: str,
+    platform_hint: str,
+    partial_row: Optional[Dict[str, Any]],
+    source_filename: str,
+    max_len: int,
+) -> Dict[str, Any]:
+    """
+    Rule-based context for one document (platform + guesses), shared by the
+    single and batched LLM paths.
+    """
+    partial_row = partial_row or {}
+    # normalized once here; every guess/guard below takes it as-is
+    full_text = _normalize_text(text or "")
+
+    # detect platform
+    platform = _detect_platform(full_text, hint=platform_hint)
+
+    # guesses
+    jp_guess, vr_guess = _guess_vat(platform, full_text)
+
+    return {
+        "full_text": full_text,
+        "document_text": _truncate_text_smart(_compress_ocr(text or ""), max_len),
+        "platform": platform,
+        "platform_hint": platform_hint,
+        "partial_row": partial_row,
+        "source_filename": source_filename,
+        "vendor_label": PLATFORM_VENDORS.get(platform, "Other"),
+        "jp_guess": jp_guess,
+        "vr_guess": vr_guess,
+        "pay_guess": _guess_payment_method(platform, full_text),
+        "vendor_tax_guess": _guess_vendor_tax_id(full_text),
+        "gap_fill": _gap_fill_fields(partial_row),
+    }
+
+def _postprocess_ai_row(
+    out: Dict[str, Any],
+    doc: Dict[str, Any],
+    schema: Dict[str, str],
+    model: str,
+    llm_used: bool = True,
+) -> Dict[str, Any]:
+    """
+    Normalize + HARD LOCK one LLM row; returns only schema keys.
+    llm_used=False: `out` is the rule-based partial_row (LLM call skipped).
+    """
+    full_text = doc["full_text"]
+    platform = doc["platform"]
+    partial_row = doc["partial_row"]
+    source_filename = doc["source_filename"]
+    vendor_label = doc["vendor_label"]
+    jp_guess, vr_guess = doc["jp_guess"], doc["vr_guess"]
+    pay_guess = doc["pay_guess"]
+    vendor_tax_guess = doc["vendor_tax_guess"]
+
+    if llm_used and doc["gap_fill"]:
+        # gap-fill reply: the rule-based fields stand, the LLM only adds the missing ones
+        out = {**(out or {}), **doc["gap_fill"]}
+
+    # dict membership is O(1): no per-row set(schema) copy
+    cleaned: Dict[str, Any] = {k: v for k, v in (out or {}).items() if k in schema}
+
+    # ---------------------------------------------------------------------
+    # Base normalization
+    # ---------------------------------------------------------------------
+    vendor_fixed, jp_fixed, vr_fixed, group_default = _PLATFORM_TABLE.get(platform) or _NO_PLATFORM_RULES
+
+    # vendor label (soft; THAI_TAX has no fixed label)
+    cleaned["D_vendor_code"] = vendor_fixed or str(cleaned.get("D_vendor_code") or vendor_label or "Other").strip()
+
+    # VAT enforcement (the clamp only runs for platforms without a fixed rule)
+    cleaned["J_price_type"] = jp_fixed or _clamp_choice(cleaned.get("J_price_type"), PRICE_TYPES, jp_guess)
+    cleaned["O_vat_rate"] = vr_fixed or _clamp_choice(cleaned.get("O_vat_rate"), VAT_RATES, vr_guess)
+
+    cleaned["E_tax_id_13"] = _to_tax13(cleaned.get("E_tax_id_13")) or vendor_tax_guess
+    cleaned["F_branch_5"] = _to_branch5(cleaned.get("F_branch_5"))
+
+    # Dates: only accept YYYYMMDD
+    for dk in ("B_doc_date", "H_invoice_date", "I_tax_purchase_date"):
+        v = str(cleaned.get(dk, "") or "").strip()
+        cleaned[dk] = v if len(v) == 8 and v.isdecimal() else ""
+
+    # numeric
+    cleaned["M_qty"] = str(cleaned.get("M_qty") or "1").strip() or "1"
+    cleaned["N_unit_price"] = _to_money_2(cleaned.get("N_unit_price")) or ""
+    cleaned["R_paid_amount"] = _to_money_2(cleaned.get("R_paid_amount")) or ""
+
+    # group
+    ug = str(cleaned.get("U_group", "") or "").strip()
+    cleaned["U_group"] = ug if ug in GROUPS else group_default
+
+    # payment
+    if not str(cleaned.get("Q_payment_method", "") or "").strip():
+        cleaned["Q_payment_method"] = pay_guess
+
+    # WHT basic normalize
+    p_wht = cleaned.get("P_wht", "")
+    if isinstance(p_wht, (int, float, Decimal)):
+        cleaned["P_wht"] = _to_money_2(p_wht) or "0"
+    else:
+        s = str(p_wht or "").strip()
+        cleaned["P_wht"] = _to_money_2(s) or ("0" if not s else "0")
+
+    # PND
+    s_pnd = str(cleaned.get("S_pnd", "") or "").strip()
+    if s_pnd not in PND_ALLOWED:
+        s_pnd = ""
+    if s_pnd == "" and cleaned.get("P_wht") not in ("", "0", "0.00"):
+        s_pnd = _guess_pnd(full_text, cleaned["P_wht"])
+    cleaned["S_pnd"] = s_pnd
+
+    # ---------------------------------------------------------------------
+    # HARD LOCKS (your requirements)
+    # ---------------------------------------------------------------------
+    hard_notes: List[str] = []
+
+    # 1) Guard: dates not from filename
+    _guard_dates_not_from_filename(cleaned, source_filename, full_text, hard_notes)
+
+    # 2) Lock doc+ref for C_reference + G_invoice_no
+    _lock_doc_ref_fields(cleaned, source_filename)
+
+    # 3) Lock K_account by client tax id (if provided)
+    client_tax_id = str(partial_row.get("client_tax_id") or partial_row.get("A_company_tax_id") or "").strip()
+    if client_tax_id:
+        _lock_k_account(cleaned, client_tax_id)
+
+    # 4) Lock description pattern by platform (Shopee etc.)
+    _lock_description_pattern(cleaned, platform, source_filename, full_text, partial_row)
+
+    # 5) Enforce WHT from subtotal (when subtotal is available)
+    _enforce_wht_from_subtotal(cleaned, full_text, partial_row, hard_notes)
+
+    # 6) Final safety: ensure N_unit_price is not negative / and not WHT
+    if cleaned.get("N_unit_price") and cleaned.get("N_unit_price") in (cleaned.get("P_wht"),):
+        # if still equal, clear it (better empty than wrong)
+        cleaned["N_unit_price"] = ""
+        hard_notes.append("N_unit_price cleared (matched WHT)")
+
+    note = str(cleaned.get("T_note", "") or "").strip()
+    lines = [ln.strip() for ln in note.splitlines() if ln.strip()]
+    if platform != "UNKNOWN":
+        lines.append(f"Platform: {platform}")
+    if source_filename:
+        lines.append(f"Source: {source_filename}")
+    if hard_notes:
+        for hn in hard_notes:
+            lines.append(f"LOCK: {hn}")
+    lines.append("Extraction: AI" if llm_used else "Extraction: rule-based (LLM skipped)")
+
+    # dedupe keep order
+    deduped: List[str] = []
+    seen = set()
+    for ln in lines:
+        if ln not in seen:
+            seen.add(ln)
+            deduped.append(ln)
+    cleaned["T_note"] = "\n".join(deduped)[:1500]
+
+    # confidence
+    try:
+        c = float(cleaned.get("_ai_confidence", 0))
+        cleaned["_ai_confidence"] = max(0.0, min(1.0, c))
+    except Exception:
+        cleaned["_ai_confidence"] = 0.0
+
+    cleaned["_ai_notes"] = str(cleaned.get("_ai_notes", "") or "").strip()
+    cleaned["_extraction_method"] = "ai_th" if "ก" in full_text else "ai_en"
+    cleaned["_platform_detected"] = platform
+    cleaned["_model_used"] = model
+
+    # Final: only schema keys
+    return {k: cleaned[k] for k in schema if k in cleaned}
+
+# vendor / VAT / group are fixed rules for these platforms, so the LLM only
+# helps when the extractor left a core field empty
+LLM_SKIP_PLATFORMS = frozenset({"META", "GOOGLE", "SPX"})
+# every field job_worker._should_call_ai checks, plus the reference
+_LLM_SKIP_REQUIRED = ("B_doc_date", "L_description", "R_paid_amount", "C_reference")
+
+def _text_too_short(doc: Dict[str, Any]) -> bool:
+    """Blank / near-empty scans: nothing for the LLM to read (AI_MIN_TEXT chars)."""
+    try:
+        min_len = int(os.getenv("AI_MIN_TEXT", "40") or "40")
+    except ValueError:
+        min_len = 40
+    return len(doc["full_text"]) < min_len
+
+def _rule_based_is_enough(doc: Dict[str, Any]) -> bool:
+    if _text_too_short(doc):
+        return True
+    if doc["platform"] not in LLM_SKIP_PLATFORMS:
+        return False
+    if not _env_bool("AI_SKIP_RULE_BASED", default=True):
+        return False
+    pr = doc["partial_row"]
+    if pr.get("_errors"):
+        return False
+    if not all(_has_value(pr.get(k)) for k in _LLM_SKIP_REQUIRED):
+        return False
+    doc_date = str(pr.get("B_doc_date") or "").strip()
+    return len(doc_date) == 8 and doc_date.isdecimal()
+
+def _finish_without_llm(doc: Dict[str, Any], schema: Dict[str, str]) -> Dict[str, Any]:
+    """Run the same normalize + HARD LOCK pass over the rule-based fields."""
+    pr = doc["partial_row"]
+    final = _postprocess_ai_row({k: pr[k] for k in schema if k in pr}, doc, schema, model="", llm_used=False)
+    reason = "text too short" if _text_too_short(doc) else "rule-based complete"
+    logger.info("AI skipped (%s): %s", reason, doc["platform"])
+    return final
+
+def _doc_payload(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-document user fields; gap-fill docs send only what the LLM still has to find."""
+    if doc["gap_fill"]:
+        missing = [k for k in _GAP_FIELDS if k not in doc["gap_fill"]]
+        return {
+            "source_file": doc["source_filename"],
+            "platform_detected": doc["platform"],
+            "instruction": f"Fill ONLY the fields in missing_fields (plus _ai_confidence/_ai_notes); these are already validated, keep them: {list(doc['gap_fill'])}",
+            "missing_fields": missing,
+            "partial_row_from_rule_based": doc["partial_row"],
+            "document_text": doc["document_text"],
+        }
+    return {
+        "source_file": doc["source_filename"],
+        "platform_detected": doc["platform"],
+        "platform_hint": doc["platform_hint"],
+        "vendor_label_guess": doc["vendor_label"],
+        "vat_guess": {"J_price_type": doc["jp_guess"], "O_vat_rate": doc["vr_guess"]},
+        "payment_guess": doc["pay_guess"],
+        "vendor_tax_id_guess": doc["vendor_tax_guess"],
+        "partial_row_from_rule_based": doc["partial_row"],
+        "document_text": doc["document_text"],
+    }
+
+def _single_doc_messages(doc: Dict[str, Any]) -> Tuple[str, str]:
+    system = _SYSTEM_PREFIX + "---PLATFORM---\n" + f"{_build_platform_specific_prompt(doc['platform'])}\n"
+    return system, _json_dumps(_doc_payload(doc))
+
+def _finish_single_doc(out: Dict[str, Any], doc: Dict[str, Any], schema: Dict[str, str], model: str) -> Dict[str, Any]:
+    if not out:
+        logger.warning("OpenAI returned empty response")
+        return {}
+
+    final = _postprocess_ai_row(out, doc, schema, model)
+    logger.info("AI extraction complete: %s confidence=%s", doc["platform"], final.get("_ai_confidence", 0))
+    return final
+
 def ai_fill_peak_row(
     text: str,
     platform_hint: str = "",
@@ -705,220 +1433,383 @@ def ai_fill_peak_row(
         _ai_confidence, _ai_notes, _platform_detected, _model_used, _extraction_method
     """
 
-    if not _env_bool("ENABLE_LLM", default=False):
-        logger.info("LLM disabled (ENABLE_LLM=0)")
+    if not _llm_ready():
         return {}
 
-    if not os.getenv("OPENAI_API_KEY"):
-        logger.warning("OPENAI_API_KEY not set")
+    try:
+        model = os.getenv("OPENAI_MODEL") or "gpt-4o-mini"
+        max_len = int(os.getenv("OPENAI_TEXT_MAX", "22000") or "22000")
+        doc = _prepare_ai_doc(text, platform_hint, partial_row, source_filename, max_len)
+
+        schema = _SCHEMA
+        if _rule_based_is_enough(doc):
+            return _finish_without_llm(doc, schema)
+
+        system, user = _single_doc_messages(doc)
+
+        out = _openai_chat_json(system=system, user=user, model=model)
+        return _finish_single_doc(out, doc, schema, model)
+
+    except Exception as e:
+        logger.error("AI extraction error: %s", e, exc_info=True)
         return {}
 
-    partial_row = partial_row or {}
-    full_text = _normalize_text(text or "")
+def _pack_batches(docs: List[Dict[str, Any]], max_docs: int, max_chars: int) -> List[List[int]]:
+    """Group doc indexes so each request stays under both the count and text caps."""
+    batches: List[List[int]] = []
+    cur: List[int] = []
+    cur_chars = 0
+    for i, d in enumerate(docs):
+        n = len(d["document_text"])
+        if cur and (len(cur) >= max_docs or cur_chars + n > max_chars):
+            batches.append(cur)
+            cur, cur_chars = [], 0
+        cur.append(i)
+        cur_chars += n
+    if cur:
+        batches.append(cur)
+    return batches
+
+def ai_fill_peak_rows(
+    items: List[Dict[str, Any]],
+    batch_size: int = AI_BATCH_MAX_DOCS,
+    max_batch_chars: int = AI_BATCH_MAX_CHARS,
+) -> List[Dict[str, Any]]:
+    """
+    Batched ai_fill_peak_row: several documents share one system prompt and one
+    OpenAI round-trip. Each item takes the ai_fill_peak_row kwargs
+    (text, platform_hint, partial_row, source_filename).
+
+    Returns one dict per item (same order); {} where extraction failed.
+    Documents missing from a batch reply are retried one by one.
+    """
+    items = list(items or [])
+    results: List[Dict[str, Any]] = [{} for _ in items]
+    if not items or not _llm_ready():
+        return results
+
+    model = os.getenv("OPENAI_MODEL") or "gpt-4o-mini"
+    max_len = int(os.getenv("OPENAI_TEXT_MAX", "22000") or "22000")
+    schema = _SCHEMA
+
+    docs: List[Optional[Dict[str, Any]]] = []
+    for it in items:
+        try:
+            docs.append(_prepare_ai_doc(
+                it.get("text") or "",
+                it.get("platform_hint") or "",
+                it.get("partial_row"),
+                it.get("source_filename") or "",
+                max_len,
+            ))
+        except Exception as e:
+            logger.error("AI batch prepare error: %s", e, exc_info=True)
+            docs.append(None)
+
+    ready: List[int] = []
+    for i, d in enumerate(docs):
+        if d is None:
+            continue
+        if _rule_based_is_enough(d):
+            try:
+                results[i] = _finish_without_llm(d, schema)
+            except Exception as e:
+                logger.error("AI batch row error: %s", e, exc_info=True)
+            continue
+        ready.append(i)
+    for batch in _pack_batches([docs[i] for i in ready], max(1, batch_size), max_batch_chars):
+        idxs = [ready[b] for b in batch]
+
+        if len(idxs) == 1:
+            it = items[idxs[0]]
+            results[idxs[0]] = ai_fill_peak_row(
+                it.get("text") or "",
+                platform_hint=it.get("platform_hint") or "",
+                partial_row=it.get("partial_row"),
+                source_filename=it.get("source_filename") or "",
+            )
+            continue
+
+        rows_by_id: Dict[str, Any] = {}
+        try:
+            system = (
+                _SYSTEM_PREFIX
+                + "Several documents are given. Apply each document's platform_rules to that document only.\n"
+                + 'Return {"rows": [...]} with exactly one row per document; each row has "id" plus the schema fields.\n'
+            )
+            user_payload = {
+                "documents": [
+                    {
+                        "id": str(i),
+                        "platform_rules": _build_platform_specific_prompt(docs[i]["platform"]),
+                        **_doc_payload(docs[i]),
+                    }
+                    for i in idxs
+                ],
+            }
+            out = _openai_chat_json(system=system, user=_json_dumps(user_payload), model=model)
+            rows = out.get("rows") if isinstance(out, dict) else None
+            for row in rows if isinstance(rows, list) else []:
+                if isinstance(row, dict):
+                    rid = str(row.get("id", ""))
+                    if rid not in rows_by_id:
+                        rows_by_id[rid] = {k: v for k, v in row.items() if k != "id"}
+        except Exception as e:
+            logger.error("AI batch extraction error: %s", e, exc_info=True)
+
+        for i in idxs:
+            row = rows_by_id.get(str(i))
+            if row is None:
+                it = items[i]
+                results[i] = ai_fill_peak_row(
+                    it.get("text") or "",
+                    platform_hint=it.get("platform_hint") or "",
+                    partial_row=it.get("partial_row"),
+                    source_filename=it.get("source_filename") or "",
+                )
+                continue
+            if not row:
+                continue  # same as an empty single-doc reply
+            try:
+                results[i] = _postprocess_ai_row(row, docs[i], schema, model)
+            except Exception as e:
+                logger.error("AI batch row error: %s", e, exc_info=True)
+
+    logger.info("AI batch extraction complete: %d docs", len(items))
+    return results
+
+async def ai_fill_peak_row_async(
+    client: Any,
+    text: str,
+    platform_hint: str = "",
+    partial_row: Optional[Dict[str, Any]] = None,
+    source_filename: str = "",
+) -> Dict[str, Any]:
+    """ai_fill_peak_row over a shared httpx.AsyncClient (see ai_fill_peak_rows_async)."""
+    if not _llm_ready():
+        return {}
 
     try:
         model = os.getenv("OPENAI_MODEL") or "gpt-4o-mini"
         max_len = int(os.getenv("OPENAI_TEXT_MAX", "22000") or "22000")
-        t = _truncate_text_smart(full_text, max_len)
-
-        # detect platform
-        platform = _detect_platform(full_text, hint=platform_hint)
-
-        # guesses
-        vendor_label = PLATFORM_VENDORS.get(platform, "Other")
-        jp_guess, vr_guess = _guess_vat(platform, full_text)
-        pay_guess = _guess_payment_method(platform, full_text)
-        vendor_tax_guess = _guess_vendor_tax_id(full_text)
-
-        platform_prompt = _build_platform_specific_prompt(platform)
-
-        schema = {
-            "B_doc_date": "YYYYMMDD (from document only; do NOT use filename codes)",
-            "C_reference": "string <=64 (will be overwritten by hard-lock doc+ref rule)",
-            "D_vendor_code": "string (vendor name/label; final may be overwritten by mapping elsewhere)",
-            "E_tax_id_13": "13 digits or empty (vendor's tax ID, NOT client's)",
-            "F_branch_5": "5 digits (00000 allowed) or empty",
-            "G_invoice_no": "string (will be overwritten by hard-lock doc+ref rule)",
-            "H_invoice_date": "YYYYMMDD (MUST come from document, never from filename)",
-            "I_tax_purchase_date": "YYYYMMDD (optional)",
-            "J_price_type": "1=VAT separated, 2=VAT included, 3=no VAT",
-            "K_account": "string (may be overwritten by client hard-lock mapping)",
-            "L_description": "string (may be overwritten by platform description pattern hard-lock)",
-            "M_qty": "number-as-string (default 1)",
-            "N_unit_price": "money 2dp (do NOT put WHT here)",
-            "O_vat_rate": "7%|NO",
-            "P_wht": "money 2dp (WHT amount; base is SUBTOTAL not TOTAL when provided)",
-            "Q_payment_method": "string",
-            "R_paid_amount": "money 2dp",
-            "S_pnd": "1|2|3|53|empty",
-            "T_note": "string (notes only)",
-            "U_group": f"one of {sorted(GROUPS)}",
-            "_ai_confidence": "0..1",
-            "_ai_notes": "Thai explanation",
-        }
+        doc = _prepare_ai_doc(text, platform_hint, partial_row, source_filename, max_len)
 
-        system = (
-            "You are a meticulous Thai accounting document extraction engine for PEAK A–U import.\n"
-            "Return STRICT JSON ONLY (no markdown).\n"
-            "\n"
-            "HARD RULES:\n"
-            "1) NEVER infer any date from filename codes (e.g., 251203). Dates must come from document text.\n"
-            "2) Do NOT put withholding tax (WHT) into unit price.\n"
-            "3) If unsure, leave empty.\n"
-            "4) Money fields: '1234.56' only.\n"
-            "5) Tax ID must be 13 digits (vendor's).\n"
-            "\n"
-            f"{platform_prompt}\n"
-        )
+        schema = _SCHEMA
+        if _rule_based_is_enough(doc):
+            return _finish_without_llm(doc, schema)
 
-        user_payload = {
-            "source_file": source_filename,
-            "platform_detected": platform,
-            "platform_hint": platform_hint,
-            "vendor_label_guess": vendor_label,
-            "vat_guess": {"J_price_type": jp_guess, "O_vat_rate": vr_guess},
-            "payment_guess": pay_guess,
-            "vendor_tax_id_guess": vendor_tax_guess,
-            "partial_row_from_rule_based": partial_row,
-            "required_schema": schema,
-            "document_text": t,
+        system, user = _single_doc_messages(doc)
+
+        out = await _openai_chat_json_async(client, system=system, user=user, model=model)
+        return _finish_single_doc(out, doc, schema, model)
+
+    except Exception as e:
+        logger.error("AI extraction error: %s", e, exc_info=True)
+        return {}
+
+async def ai_fill_peak_rows_async(items: List[Dict[str, Any]], max_concurrency: int = 10) -> List[Dict[str, Any]]:
+    """
+    Run ai_fill_peak_row for many documents with up to max_concurrency requests
+    in flight. Returns one dict per item, in order.
+    """
+    items = list(items or [])
+    if not items or not _llm_ready():
+        return [{} for _ in items]
+
+    sem = asyncio.Semaphore(max(1, int(max_concurrency)))
+
+    def _kwargs(it: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "text": it.get("text") or "",
+            "platform_hint": it.get("platform_hint") or "",
+            "partial_row": it.get("partial_row"),
+            "source_filename": it.get("source_filename") or "",
         }
 
-        out = _openai_chat_json(system=system, user=json.dumps(user_payload, ensure_ascii=False), model=model)
-        if not out:
-            logger.warning("OpenAI returned empty response")
-            return {}
+    if httpx is None:
+        # no async client available: same concurrency bound over worker threads
+        async def _one_sync(it: Dict[str, Any]) -> Dict[str, Any]:
+            async with sem:
+                return await asyncio.to_thread(ai_fill_peak_row, **_kwargs(it))
 
-        allowed = set(schema.keys())
-        cleaned: Dict[str, Any] = {k: v for k, v in (out or {}).items() if k in allowed}
+        return list(await asyncio.gather(*(_one_sync(it) for it in items)))
 
-        # ---------------------------------------------------------------------
-        # Base normalization
-        # ---------------------------------------------------------------------
-        # vendor label (soft)
-        if platform in PLATFORM_VENDORS and PLATFORM_VENDORS[platform]:
-            cleaned["D_vendor_code"] = PLATFORM_VENDORS[platform]
-        else:
-            cleaned["D_vendor_code"] = str(cleaned.get("D_vendor_code") or vendor_label or "Other").strip()
+    limits = httpx.Limits(max_connections=max(1, int(max_concurrency)))
+    async with httpx.AsyncClient(limits=limits) as client:
+        async def _one(it: Dict[str, Any]) -> Dict[str, Any]:
+            async with sem:
+                return await ai_fill_peak_row_async(client, **_kwargs(it))
 
-        # VAT enforcement
-        if platform in PLATFORM_VAT_RULES:
-            rules = PLATFORM_VAT_RULES[platform]
-            cleaned["J_price_type"] = rules["J_price_type"]
-            cleaned["O_vat_rate"] = rules["O_vat_rate"]
-        else:
-            cleaned["J_price_type"] = _clamp_choice(cleaned.get("J_price_type"), PRICE_TYPES, jp_guess)
-            cleaned["O_vat_rate"] = _clamp_choice(cleaned.get("O_vat_rate"), VAT_RATES, vr_guess)
-
-        cleaned["E_tax_id_13"] = _to_tax13(cleaned.get("E_tax_id_13")) or vendor_tax_guess
-        cleaned["F_branch_5"] = _to_branch5(cleaned.get("F_branch_5"))
-
-        # Dates: only accept YYYYMMDD
-        for dk in ("B_doc_date", "H_invoice_date", "I_tax_purchase_date"):
-            v = str(cleaned.get(dk, "") or "").strip()
-            cleaned[dk] = v if re.fullmatch(r"\d{8}", v) else ""
-
-        # numeric
-        cleaned["M_qty"] = str(cleaned.get("M_qty") or "1").strip() or "1"
-        cleaned["N_unit_price"] = _to_money_2(cleaned.get("N_unit_price")) or ""
-        cleaned["R_paid_amount"] = _to_money_2(cleaned.get("R_paid_amount")) or ""
-
-        # group
-        ug = str(cleaned.get("U_group", "") or "").strip()
-        cleaned["U_group"] = ug if ug in GROUPS else PLATFORM_GROUPS.get(platform, "Other Expense")
-
-        # payment
-        if not str(cleaned.get("Q_payment_method", "") or "").strip():
-            cleaned["Q_payment_method"] = pay_guess
-
-        # WHT basic normalize
-        p_wht = cleaned.get("P_wht", "")
-        if isinstance(p_wht, (int, float, Decimal)):
-            cleaned["P_wht"] = _to_money_2(p_wht) or "0"
-        else:
-            s = str(p_wht or "").strip()
-            cleaned["P_wht"] = _to_money_2(s) or ("0" if not s else "0")
-
-        # PND
-        s_pnd = str(cleaned.get("S_pnd", "") or "").strip()
-        if s_pnd not in PND_ALLOWED:
-            s_pnd = ""
-        if s_pnd == "" and cleaned.get("P_wht") not in ("", "0", "0.00"):
-            s_pnd = _guess_pnd(full_text, cleaned["P_wht"])
-        cleaned["S_pnd"] = s_pnd
-
-        # ---------------------------------------------------------------------
-        # HARD LOCKS (your requirements)
-        # ---------------------------------------------------------------------
-        hard_notes: List[str] = []
-
-        # 1) Guard: dates not from filename
-        _guard_dates_not_from_filename(cleaned, source_filename, full_text, hard_notes)
-
-        # 2) Lock doc+ref for C_reference + G_invoice_no
-        _lock_doc_ref_fields(cleaned, source_filename)
-
-        # 3) Lock K_account by client tax id (if provided)
-        client_tax_id = str(partial_row.get("client_tax_id") or partial_row.get("A_company_tax_id") or "").strip()
-        if client_tax_id:
-            _lock_k_account(cleaned, client_tax_id)
-
-        # 4) Lock description pattern by platform (Shopee etc.)
-        _lock_description_pattern(cleaned, platform, source_filename, full_text, partial_row)
-
-        # 5) Enforce WHT from subtotal (when subtotal is available)
-        _enforce_wht_from_subtotal(cleaned, full_text, partial_row, hard_notes)
-
-        # 6) Final safety: ensure N_unit_price is not negative / and not WHT
-        if cleaned.get("N_unit_price") and cleaned.get("N_unit_price") in (cleaned.get("P_wht"),):
-            # if still equal, clear it (better empty than wrong)
-            cleaned["N_unit_price"] = ""
-            hard_notes.append("N_unit_price cleared (matched WHT)")
-
-        note = str(cleaned.get("T_note", "") or "").strip()
-        lines = [ln.strip() for ln in note.splitlines() if ln.strip()]
-        if platform != "UNKNOWN":
-            lines.append(f"Platform: {platform}")
-        if source_filename:
-            lines.append(f"Source: {source_filename}")
-        if hard_notes:
-            for hn in hard_notes:
-                lines.append(f"LOCK: {hn}")
-        lines.append("Extraction: AI")
-
-        # dedupe keep order
-        deduped: List[str] = []
-        seen = set()
-        for ln in lines:
-            if ln not in seen:
-                seen.add(ln)
-                deduped.append(ln)
-        cleaned["T_note"] = "\n".join(deduped)[:1500]
-
-        # confidence
+        return list(await asyncio.gather(*(_one(it) for it in items)))
+
+def run_batch(items: List[Dict[str, Any]], max_concurrency: int = 10) -> List[Dict[str, Any]]:
+    """Sync entry for worker threads: concurrent per-document extraction."""
+    return asyncio.run(ai_fill_peak_rows_async(items, max_concurrency=max_concurrency))
+
+def ai_fill_peak_rows_parallel(items: List[Dict[str, Any]], max_workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Thread-pool twin of run_batch for callers already inside an event loop.
+    max_workers defaults to OPENAI_MAX_CONCURRENCY (8); 429/5xx backoff is
+    done by the pooled session's Retry.
+    """
+    items = list(items or [])
+    if not items or not _llm_ready():
+        return [{} for _ in items]
+
+    if max_workers is None:
+        max_workers = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8") or "8")
+
+    def _one(it: Dict[str, Any]) -> Dict[str, Any]:
+        return ai_fill_peak_row(
+            it.get("text") or "",
+            platform_hint=it.get("platform_hint") or "",
+            partial_row=it.get("partial_row"),
+            source_filename=it.get("source_filename") or "",
+        )
+
+    with ThreadPoolExecutor(max_workers=max(1, min(int(max_workers), len(items)))) as pool:
+        return list(pool.map(_one, items))
+
+# ---------------------------------------------------------------------
+# OpenAI Batch API (bulk, non-interactive; results within 24h at ~half cost)
+# ---------------------------------------------------------------------
+def _batch_docs(items: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+    max_len = int(os.getenv("OPENAI_TEXT_MAX", "22000") or "22000")
+    docs: List[Optional[Dict[str, Any]]] = []
+    for it in items:
         try:
-            c = float(cleaned.get("_ai_confidence", 0))
-            cleaned["_ai_confidence"] = max(0.0, min(1.0, c))
-        except Exception:
-            cleaned["_ai_confidence"] = 0.0
+            docs.append(_prepare_ai_doc(
+                it.get("text") or "",
+                it.get("platform_hint") or "",
+                it.get("partial_row"),
+                it.get("source_filename") or "",
+                max_len,
+            ))
+        except Exception as e:
+            logger.error("AI batch prepare error: %s", e, exc_info=True)
+            docs.append(None)
+    return docs
+
+def ai_submit_batch(items: List[Dict[str, Any]]) -> str:
+    """
+    Upload one /chat/completions request per item (custom_id = item index) as a
+    Batch API job. Needs OPENAI_USE_BATCH=1. Returns the batch id ("" if nothing
+    was submitted); collect later with ai_collect_batch(batch_id, items).
+    """
+    items = list(items or [])
+    if not items or not _llm_ready():
+        return ""
+    if not _env_bool("OPENAI_USE_BATCH", default=False):
+        logger.info("Batch API disabled (OPENAI_USE_BATCH=0)")
+        return ""
+
+    try:
+        model = os.getenv("OPENAI_MODEL") or "gpt-4o-mini"
+        lines: List[bytes] = []
+        for i, d in enumerate(_batch_docs(items)):
+            if d is None or _rule_based_is_enough(d):
+                continue
+            system, user = _single_doc_messages(d)
+            _, _, payload, _ = _openai_request(system, user, model)
+            lines.append(_json_body(
+                {"custom_id": str(i), "method": "POST", "url": "/v1/chat/completions", "body": payload},
+            ))
+        if not lines:
+            return ""
 
-        cleaned["_ai_notes"] = str(cleaned.get("_ai_notes", "") or "").strip()
-        cleaned["_extraction_method"] = "ai_th" if "ก" in full_text else "ai_en"
-        cleaned["_platform_detected"] = platform
-        cleaned["_model_used"] = model
+        base_url, api_key = _openai_base()
+        auth = {"Authorization": f"Bearer {api_key}"}
+        timeout = float(os.getenv("OPENAI_TIMEOUT", "90") or "90")
+        # no automatic retries: a 5xx after the server accepted the upload would duplicate the job
+        sess = _http_session(retry=False)
+
+        r = sess.post(
+            base_url + "/files",
+            headers=auth,
+            data={"purpose": "batch"},
+            files={"file": ("peak_rows.jsonl", b"\n".join(lines), "application/jsonl")},
+            timeout=timeout,
+        )
+        r.raise_for_status()
+        r = sess.post(
+            base_url + "/batches",
+            headers=auth,
+            json={"input_file_id": r.json()["id"], "endpoint": "/v1/chat/completions", "completion_window": "24h"},
+            timeout=timeout,
+        )
+        r.raise_for_status()
+        batch_id = str(r.json()["id"])
+        logger.info("AI batch submitted: %s (%d requests)", batch_id, len(lines))
+        return batch_id
 
-        # Final: only schema keys
-        final: Dict[str, Any] = {}
-        for k in schema.keys():
-            if k in cleaned:
-                final[k] = cleaned[k]
+    except Exception as e:
+        logger.error("AI batch submit error: %s", e, exc_info=True)
+        return ""
 
-        logger.info("AI extraction complete: %s confidence=%s", platform, final.get("_ai_confidence", 0))
-        return final
+# terminal Batch API statuses; anything else (validating, in_progress, finalizing, cancelling) is pending
+BATCH_DONE_STATUSES = frozenset({"completed", "failed", "expired", "cancelled"})
 
+def ai_collect_batch(batch_id: str, items: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Fetch a finished Batch API job for the same `items` passed to ai_submit_batch.
+    Returns None while the batch is still running or could not be fetched (call
+    again later), else one dict per item ({} where extraction failed),
+    post-processed exactly like ai_fill_peak_row. If the batch ended failed /
+    expired / cancelled, items without a reply get {"_error": "AI batch <status>"}.
+    """
+    items = list(items or [])
+    results: List[Dict[str, Any]] = [{} for _ in items]
+    if not batch_id or not items:
+        return results
+
+    try:
+        base_url, api_key = _openai_base()
+        auth = {"Authorization": f"Bearer {api_key}"}
+        timeout = float(os.getenv("OPENAI_TIMEOUT", "90") or "90")
+        sess = _http_session()
+
+        r = sess.get(f"{base_url}/batches/{batch_id}", headers=auth, timeout=timeout)
+        r.raise_for_status()
+        info = r.json()
+        status = info.get("status")
+        if status not in BATCH_DONE_STATUSES:
+            return None
+
+        bodies: Dict[str, Any] = {}
+        if info.get("output_file_id"):
+            r = sess.get(f"{base_url}/files/{info['output_file_id']}/content", headers=auth, timeout=timeout)
+            r.raise_for_status()
+            for line in r.content.splitlines():
+                try:
+                    rec = _json_loads(line)
+                    resp = rec.get("response") or {}
+                    if resp.get("status_code") == 200:
+                        bodies[str(rec.get("custom_id"))] = resp.get("body")
+                except Exception:
+                    continue
     except Exception as e:
-        logger.error("AI extraction error: %s", e, exc_info=True)
-        return {}
+        # transport / HTTP error: the batch may still be running, so not "all rows failed"
+        logger.error("AI batch collect error: %s", e, exc_info=True)
+        return None
 
+    if status != "completed":
+        logger.error("AI batch %s ended with status %s: %s", batch_id, status, info.get("errors"))
 
-__all__ = ["ai_fill_peak_row", "PLATFORM_VENDORS", "PLATFORM_VAT_RULES", "PLATFORM_GROUPS"]
+    model = os.getenv("OPENAI_MODEL") or "gpt-4o-mini"
+    schema = _SCHEMA
+    for i, d in enumerate(_batch_docs(items)):
+        if d is None:
+            continue
+        try:
+            if _rule_based_is_enough(d):
+                results[i] = _finish_without_llm(d, schema)
+            elif str(i) in bodies:
+                results[i] = _finish_single_doc(_parse_chat_json(bodies[str(i)]), d, schema, model)
+            elif status != "completed":
+                results[i] = {"_error": f"AI batch {status}"}
+        except Exception as e:
+            logger.error("AI batch row error: %s", e, exc_info=True)
+    return results
+
+
+__all__ = ["ai_fill_peak_row", "ai_fill_peak_rows", "ai_fill_peak_rows_async", "ai_fill_peak_rows_parallel", "ai_submit_batch", "ai_collect_batch", "run_batch", "PLATFORM_VENDORS", "PLATFORM_VAT_RULES", "PLATFORM_GROUPS"]
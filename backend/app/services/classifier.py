@@ -4,10 +4,17 @@ from __future__ import annotations
 import os
 import re
 import logging
-from typing import Literal, Dict, Tuple, Optional
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Literal, Dict, Tuple, Optional, FrozenSet, Iterator
 
 from ..utils.text_utils import normalize_text
 
+try:
+    import ahocorasick  # optional: one pass over the text for every soft keyword
+except Exception:  # pragma: no cover
+    ahocorasick = None  # type: ignore
+
 logger = logging.getLogger(__name__)
 
 # ✅ 8 platforms (aligned with export_service & ai_service)
@@ -25,38 +32,62 @@ PlatformLabel = Literal[
 # ---------------------------------------------------------------------
 # Strong ID Regex (High Confidence)
 # ---------------------------------------------------------------------
+# Matched against _norm() output, which is already lowercased -> lowercase
+# literals, no re.IGNORECASE.
 
 # Meta/Facebook Ads patterns
-RE_META_RECEIPT = re.compile(r"\bRC\s*META\s*[A-Z0-9\-/]{6,}\b", re.IGNORECASE)
-RE_META_IRELAND = re.compile(r"meta\s*platforms?\s*ireland", re.IGNORECASE)
-RE_FACEBOOK = re.compile(r"\b(facebook|fb\s*ads|instagram\s*ads)\b", re.IGNORECASE)
+RE_META_RECEIPT = re.compile(r"\brc\s*meta\s*[a-z0-9\-/]{6,}\b")
+RE_META_IRELAND = re.compile(r"meta\s*platforms?\s*ireland")
+RE_FACEBOOK = re.compile(r"\b(facebook|fb\s*ads|instagram\s*ads)\b")
 
 # Google Ads patterns
-RE_GOOGLE_PAYMENT = re.compile(r"\b[VW]\s*\d{15,20}\b", re.IGNORECASE)  # V0971174339667745
-RE_GOOGLE_ASIA = re.compile(r"google\s*asia\s*pacific", re.IGNORECASE)
-RE_GOOGLE_ADS = re.compile(r"\b(google\s*ad(?:s|words)?|google\s*advertising)\b", re.IGNORECASE)
+# (?<!\w[vw]) == \b before the v/w, but keeps [vw] first so SRE can skip ahead to it
+RE_GOOGLE_PAYMENT = re.compile(r"[vw](?<!\w[vw])\s*\d{15,20}\b")  # V0971174339667745
+RE_GOOGLE_ASIA = re.compile(r"google\s*asia\s*pacific")
+RE_GOOGLE_ADS = re.compile(r"\b(google\s*ad(?:s|words)?|google\s*advertising)\b")
 
 # Thai Tax Invoice patterns
-RE_THAI_TAX_INVOICE = re.compile(r"(ใบกำกับภาษี|ใบเสร็จรับเงิน|tax\s*invoice)", re.IGNORECASE)
+RE_THAI_TAX_INVOICE = re.compile(r"(ใบกำกับภาษี|ใบเสร็จรับเงิน|tax\s*invoice)")
 RE_TAX_ID_13 = re.compile(r"\b(\d{13})\b")
-RE_BRANCH_5 = re.compile(r"(?:branch|สาขา)\s*[:#]?\s*(\d{5})", re.IGNORECASE)
+RE_BRANCH_5 = re.compile(r"(?:branch|สาขา)\s*[:#]?\s*(\d{5})")
 
 # SPX patterns (shipping docs)
-RE_SPX_RCSPX = re.compile(r"\bRCS\s*PX\s*[A-Z0-9\-/]{6,}\b", re.IGNORECASE)
-RE_SPX_RCS_ANY = re.compile(r"\bRCS\s*[A-Z0-9]{3,}\b", re.IGNORECASE)
+RE_SPX_RCSPX = re.compile(r"\brcs\s*px\s*[a-z0-9\-/]{6,}\b")
+RE_SPX_RCS_ANY = re.compile(r"\brcs\s*[a-z0-9]{3,}\b")
 
 # Lazada
-RE_LAZADA_THMPTI = re.compile(r"\bTHMPTI\s*\d{10,20}\b", re.IGNORECASE)
+RE_LAZADA_THMPTI = re.compile(r"\bthmpti\s*\d{10,20}\b")
 
 # TikTok
-RE_TIKTOK_TTSTH = re.compile(r"\bTTSTH[0-9A-Z\-/]*\b", re.IGNORECASE)
-RE_TIKTOK_WORD = re.compile(r"\btiktok\b", re.IGNORECASE)
+RE_TIKTOK_TTSTH = re.compile(r"\bttsth[0-9a-z\-/]*\b")
+RE_TIKTOK_WORD = re.compile(r"\btiktok\b")
 
 # Shopee
-RE_SHOPEE_TIV = re.compile(r"\bTIV\s*-\s*[A-Z0-9]{3,}\b", re.IGNORECASE)
-RE_SHOPEE_TIR = re.compile(r"\bTIR\s*-\s*[A-Z0-9]{3,}\b", re.IGNORECASE)
-RE_SHOPEE_WORD = re.compile(r"\bshopee\b", re.IGNORECASE)
-RE_SHOPEE_TRS = re.compile(r"\bTRS\b", re.IGNORECASE)  # weak; only with shopee context
+RE_SHOPEE_TIV = re.compile(r"\btiv\s*-\s*[a-z0-9]{3,}\b")
+RE_SHOPEE_TIR = re.compile(r"\btir\s*-\s*[a-z0-9]{3,}\b")
+RE_SHOPEE_WORD = re.compile(r"\bshopee\b")
+RE_SHOPEE_TRS = re.compile(r"\btrs\b")  # weak; only with shopee context
+
+# Literals every match must contain once _norm() has lowercased the text
+# (NFKC already turned ſ/K into s/k). _regex_hit skips the regex when none is
+# present; RE_GOOGLE_PAYMENT has no usable anchor.
+_RX_ANCHORS: Dict[re.Pattern, Tuple[str, ...]] = {
+    RE_META_RECEIPT: ("meta",),
+    RE_META_IRELAND: ("ireland",),
+    RE_FACEBOOK: ("facebook", "fb", "instagram"),
+    RE_GOOGLE_ASIA: ("google",),
+    RE_GOOGLE_ADS: ("google",),
+    RE_THAI_TAX_INVOICE: ("ใบกำกับภาษี", "ใบเสร็จรับเงิน", "tax"),
+    RE_BRANCH_5: ("branch", "สาขา"),
+    RE_SPX_RCSPX: ("rcs",),
+    RE_LAZADA_THMPTI: ("thmpti",),
+    RE_TIKTOK_TTSTH: ("ttsth",),
+    RE_TIKTOK_WORD: ("tiktok",),
+    RE_SHOPEE_TIV: ("tiv",),
+    RE_SHOPEE_TIR: ("tir",),
+    RE_SHOPEE_WORD: ("shopee",),
+    RE_SHOPEE_TRS: ("trs",),
+}
 
 # ---------------------------------------------------------------------
 # Filename-only hints (สำคัญมากเวลาข้อความใน PDF สั้น)
@@ -134,43 +165,92 @@ INVOICE_SIGS = (
     "ใบกำกับภาษี", "tax invoice", "receipt", "ใบเสร็จ", "invoice",
 )
 
+# every literal _weighted_score looks for in the document text, plus the
+# regex anchors (so the same scan decides which regexes are worth running)
+_TEXT_NEEDLES: Tuple[str, ...] = tuple(sorted({
+    *META_SIGS_STRONG, *META_SIGS_WEAK, *GOOGLE_SIGS_STRONG, *GOOGLE_SIGS_WEAK,
+    *THAI_TAX_SIGS, *SHOPEE_SIGS, *LAZADA_SIGS, *TIKTOK_SIGS, *SPX_SIGS,
+    "rcspx", "trs", "shopee", "tiv", "tir",
+    *(a for anchors in _RX_ANCHORS.values() for a in anchors),
+} - {""}))
+
+
+def _build_needle_automaton():
+    if ahocorasick is None:
+        return None
+    try:
+        a = ahocorasick.Automaton()
+        for n in _TEXT_NEEDLES:
+            a.add_word(n, n)
+        a.make_automaton()
+        return a
+    except Exception as e:  # pragma: no cover
+        logger.warning("Aho-Corasick build failed, using substring scans: %s", e)
+        return None
+
+
+_NEEDLE_AUTOMATON = _build_needle_automaton()
+
 # Known client tax IDs (exclude from vendor detection)
-CLIENT_TAX_IDS = {
+CLIENT_TAX_IDS: FrozenSet[str] = frozenset({
     "0105563022918",  # SHD
     "0105561071873",  # Rabbit
     "0105565027615",  # TopOne
-}
+})
+# first 13-digit id that is not one of our clients, in a single C-level search
+RE_VENDOR_TAX_ID_13 = re.compile(
+    r"\b(?!(?:" + "|".join(sorted(CLIENT_TAX_IDS)) + r")\b)(\d{13})\b"
+) if CLIENT_TAX_IDS else RE_TAX_ID_13
 
 # ---------------------------------------------------------------------
 # NEW: Marketplace identity extraction (for description building)
 # ---------------------------------------------------------------------
-RE_SELLER_ID = re.compile(r"\bSeller\s*ID\b\s*[:#]?\s*([0-9]{6,20})\b", re.IGNORECASE)
-RE_USERNAME = re.compile(r"\bUsername\b\s*[:#]?\s*([A-Za-z0-9_.\-]{2,64})\b", re.IGNORECASE)
+RE_SELLER_ID = re.compile(r"\bseller\s*id\b\s*[:#]?\s*([0-9]{6,20})\b")
+RE_USERNAME = re.compile(r"\busername\b\s*[:#]?\s*([a-z0-9_.\-]{2,64})\b")
 
 # Sometimes appears in Shopee docs as: "Seller ID 1646465545  nextgadget"
-RE_SELLER_ID_LOOSE = re.compile(r"\bseller\s*id\s*[:#]?\s*([0-9]{6,20})\b", re.IGNORECASE)
+RE_SELLER_ID_LOOSE = re.compile(r"\bseller\s*id\s*[:#]?\s*([0-9]{6,20})\b")
 
 # ---------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------
+@lru_cache(maxsize=32)
 def _norm(s: str) -> str:
-    """Normalize + lower + trim; keep speed stable"""
+    """Normalize + lower + trim; keep speed stable (cached: callers re-normalize the same doc)"""
     try:
         t = normalize_text(s or "").lower()
         # prevent mega text slowdown
         if len(t) > 160_000:
-            t = t[:100_000] + "\n...\n" + t[-40_000:]
+            t = "".join((t[:100_000], "\n...\n", t[-40_000:]))
         return t
     except Exception as e:
         logger.warning("Normalization error: %s", e)
         return ""
 
 
-def _contains_any(t: str, needles: tuple[str, ...]) -> bool:
-    return any(n and (n in t) for n in needles)
+def _contains_any(t: str | FrozenSet[str], needles: tuple[str, ...]) -> bool:
+    return any(map(t.__contains__, filter(None, needles)))
 
 
-def _count_contains(t: str, needles: tuple[str, ...]) -> int:
+@lru_cache(maxsize=32)
+def _present_needles(t: str) -> FrozenSet[str]:
+    """
+    Which _TEXT_NEEDLES occur in t. _count_contains/_contains_any accept the
+    result in place of the text (set membership == substring hit).
+    """
+    if _NEEDLE_AUTOMATON is not None and t:
+        found = set()
+        remaining = len(_TEXT_NEEDLES)
+        for _end, n in _NEEDLE_AUTOMATON.iter(t):
+            if n not in found:
+                found.add(n)
+                if len(found) == remaining:
+                    break
+        return frozenset(found)
+    return frozenset(n for n in _TEXT_NEEDLES if n in t)
+
+
+def _count_contains(t: str | FrozenSet[str], needles: tuple[str, ...]) -> int:
     hit = 0
     for n in needles:
         if n and (n in t):
@@ -178,8 +258,12 @@ def _count_contains(t: str, needles: tuple[str, ...]) -> int:
     return hit
 
 
-def _regex_hit(t: str, rx: re.Pattern) -> bool:
+def _regex_hit(t: str, rx: re.Pattern, present: Optional[FrozenSet[str]] = None) -> bool:
+    """present: _present_needles(t) when already known (anchor check -> set lookups)"""
     try:
+        anchors = _RX_ANCHORS.get(rx)
+        if anchors and not _contains_any(t if present is None else present, anchors):
+            return False
         return rx.search(t) is not None
     except Exception:
         return False
@@ -191,11 +275,7 @@ def _has_vendor_tax_id(t: str) -> bool:
     (Strong indicator for Thai Tax Invoice)
     """
     try:
-        for m in RE_TAX_ID_13.finditer(t):
-            tax = m.group(1)
-            if tax and tax not in CLIENT_TAX_IDS:
-                return True
-        return False
+        return RE_VENDOR_TAX_ID_13.search(t) is not None
     except Exception:
         return False
 
@@ -260,6 +340,20 @@ def extract_marketplace_identity(text: str) -> Tuple[str, str]:
         return "", ""
 
 
+_SCORE_LABELS: Tuple[str, ...] = ("META", "GOOGLE", "SHOPEE", "LAZADA", "TIKTOK", "SPX", "THAI_TAX")
+# winning score per platform, in priority order (_iter_scores yields in this order)
+_THRESHOLDS: Tuple[Tuple[str, int], ...] = (
+    ("META", 55),
+    ("GOOGLE", 55),
+    ("SPX", 45),
+    ("LAZADA", 42),
+    ("TIKTOK", 34),
+    ("SHOPEE", 34),
+    ("THAI_TAX", 70),
+)
+_THRESHOLD_BY_LABEL: Dict[str, int] = dict(_THRESHOLDS)
+
+
 def _filename_boost(score: Dict[str, int], fn: str) -> None:
     """Filename-only boosting (critical for short PDFs / image-based)"""
     if not fn:
@@ -284,110 +378,211 @@ def _filename_boost(score: Dict[str, int], fn: str) -> None:
         score["SHOPEE"] += 24
 
 
-def _weighted_score(t: str, filename: str) -> Dict[str, int]:
+def _iter_scores(t: str, fn: str) -> Iterator[Tuple[str, int]]:
     """
-    ✅ Weighted scoring using BOTH text and filename
+    ✅ Weighted scoring using BOTH text and filename (both already _norm'd)
+    Yields (label, final score) in _THRESHOLDS priority order.
     """
-    fn = _norm(filename)
     tt = t
+    # one scan for every soft keyword; hits are then set lookups
+    present = _present_needles(tt)
 
-    score: Dict[str, int] = {
-        "META": 0,
-        "GOOGLE": 0,
-        "SHOPEE": 0,
-        "LAZADA": 0,
-        "TIKTOK": 0,
-        "SPX": 0,
-        "THAI_TAX": 0,
-    }
+    score: Dict[str, int] = dict.fromkeys(_SCORE_LABELS, 0)
 
     # filename boost
     _filename_boost(score, fn)
 
     # META strong
-    if _regex_hit(tt, RE_META_RECEIPT) or _regex_hit(fn, RE_META_RECEIPT):
+    if _regex_hit(tt, RE_META_RECEIPT, present) or _regex_hit(fn, RE_META_RECEIPT):
         score["META"] += 170
-    if _regex_hit(tt, RE_META_IRELAND) or _regex_hit(fn, RE_META_IRELAND):
+    if _regex_hit(tt, RE_META_IRELAND, present) or _regex_hit(fn, RE_META_IRELAND):
         score["META"] += 165
-    if _regex_hit(tt, RE_FACEBOOK) or _regex_hit(fn, RE_FACEBOOK):
+    if _regex_hit(tt, RE_FACEBOOK, present) or _regex_hit(fn, RE_FACEBOOK):
         score["META"] += 90
-    score["META"] += 16 * _count_contains(tt, META_SIGS_STRONG)
-    score["META"] += 10 * _count_contains(tt, META_SIGS_WEAK)
+    score["META"] += 16 * _count_contains(present, META_SIGS_STRONG)
+    score["META"] += 10 * _count_contains(present, META_SIGS_WEAK)
+
+    yield "META", score["META"]
 
     # GOOGLE strong
-    if _regex_hit(tt, RE_GOOGLE_PAYMENT) or _regex_hit(fn, RE_GOOGLE_PAYMENT):
+    if _regex_hit(tt, RE_GOOGLE_PAYMENT, present) or _regex_hit(fn, RE_GOOGLE_PAYMENT):
         score["GOOGLE"] += 170
-    if _regex_hit(tt, RE_GOOGLE_ASIA) or _regex_hit(fn, RE_GOOGLE_ASIA):
+    if _regex_hit(tt, RE_GOOGLE_ASIA, present) or _regex_hit(fn, RE_GOOGLE_ASIA):
         score["GOOGLE"] += 165
-    if _regex_hit(tt, RE_GOOGLE_ADS) or _regex_hit(fn, RE_GOOGLE_ADS):
+    if _regex_hit(tt, RE_GOOGLE_ADS, present) or _regex_hit(fn, RE_GOOGLE_ADS):
         score["GOOGLE"] += 90
-    score["GOOGLE"] += 16 * _count_contains(tt, GOOGLE_SIGS_STRONG)
-    score["GOOGLE"] += 10 * _count_contains(tt, GOOGLE_SIGS_WEAK)
+    score["GOOGLE"] += 16 * _count_contains(present, GOOGLE_SIGS_STRONG)
+    score["GOOGLE"] += 10 * _count_contains(present, GOOGLE_SIGS_WEAK)
+
+    yield "GOOGLE", score["GOOGLE"]
 
     # SPX BEFORE Shopee
-    if _regex_hit(tt, RE_SPX_RCSPX) or _regex_hit(fn, RE_SPX_RCSPX):
+    if _regex_hit(tt, RE_SPX_RCSPX, present) or _regex_hit(fn, RE_SPX_RCSPX):
         score["SPX"] += 145
-    if "rcspx" in tt or "rcspx" in fn:
+    if "rcspx" in present or "rcspx" in fn:
         score["SPX"] += 145
-    score["SPX"] += 10 * _count_contains(tt, SPX_SIGS)
+    score["SPX"] += 10 * _count_contains(present, SPX_SIGS)
+
+    yield "SPX", score["SPX"]
 
     # LAZADA
-    if _regex_hit(tt, RE_LAZADA_THMPTI) or _regex_hit(fn, RE_LAZADA_THMPTI):
+    if _regex_hit(tt, RE_LAZADA_THMPTI, present) or _regex_hit(fn, RE_LAZADA_THMPTI):
         score["LAZADA"] += 120
-    score["LAZADA"] += 10 * _count_contains(tt, LAZADA_SIGS)
+    score["LAZADA"] += 10 * _count_contains(present, LAZADA_SIGS)
+
+    yield "LAZADA", score["LAZADA"]
 
     # TIKTOK
-    if _regex_hit(tt, RE_TIKTOK_TTSTH) or _regex_hit(fn, RE_TIKTOK_TTSTH):
+    if _regex_hit(tt, RE_TIKTOK_TTSTH, present) or _regex_hit(fn, RE_TIKTOK_TTSTH):
         score["TIKTOK"] += 120
-    if _regex_hit(tt, RE_TIKTOK_WORD) or _regex_hit(fn, RE_TIKTOK_WORD):
+    if _regex_hit(tt, RE_TIKTOK_WORD, present) or _regex_hit(fn, RE_TIKTOK_WORD):
         score["TIKTOK"] += 25
-    score["TIKTOK"] += 10 * _count_contains(tt, TIKTOK_SIGS)
+    score["TIKTOK"] += 10 * _count_contains(present, TIKTOK_SIGS)
+
+    yield "TIKTOK", score["TIKTOK"]
 
     # SHOPEE
-    if _regex_hit(tt, RE_SHOPEE_TIV) or _regex_hit(fn, RE_SHOPEE_TIV):
+    if _regex_hit(tt, RE_SHOPEE_TIV, present) or _regex_hit(fn, RE_SHOPEE_TIV):
         score["SHOPEE"] += 110
-    if _regex_hit(tt, RE_SHOPEE_TIR) or _regex_hit(fn, RE_SHOPEE_TIR):
+    if _regex_hit(tt, RE_SHOPEE_TIR, present) or _regex_hit(fn, RE_SHOPEE_TIR):
         score["SHOPEE"] += 110
-    if _regex_hit(tt, RE_SHOPEE_WORD) or _regex_hit(fn, RE_SHOPEE_WORD):
+    if _regex_hit(tt, RE_SHOPEE_WORD, present) or _regex_hit(fn, RE_SHOPEE_WORD):
         score["SHOPEE"] += 22
-    score["SHOPEE"] += 10 * _count_contains(tt, SHOPEE_SIGS)
+    score["SHOPEE"] += 10 * _count_contains(present, SHOPEE_SIGS)
 
     # TRS weak: only with Shopee context
-    trs = _regex_hit(tt, RE_SHOPEE_TRS) or ("trs" in tt)
+    trs = ("trs" in present) or _regex_hit(tt, RE_SHOPEE_TRS, present)
     if trs:
-        has_ctx = ("shopee" in tt) or ("tiv" in tt) or ("tir" in tt) or ("shopee" in fn)
+        has_ctx = ("shopee" in present) or ("tiv" in present) or ("tir" in present) or ("shopee" in fn)
         if has_ctx:
             score["SHOPEE"] += 18
 
+    yield "SHOPEE", score["SHOPEE"]
+
     # THAI_TAX (conservative)
-    if _regex_hit(tt, RE_THAI_TAX_INVOICE):
+    if _regex_hit(tt, RE_THAI_TAX_INVOICE, present):
         score["THAI_TAX"] += 55
     if _has_vendor_tax_id(tt):
         score["THAI_TAX"] += 70
-    if _regex_hit(tt, RE_BRANCH_5):
+    if _regex_hit(tt, RE_BRANCH_5, present):
         score["THAI_TAX"] += 35
-    score["THAI_TAX"] += 10 * _count_contains(tt, THAI_TAX_SIGS)
+    score["THAI_TAX"] += 10 * _count_contains(present, THAI_TAX_SIGS)
 
     # penalties if strong other platform exists
     if score["META"] >= 70 or score["GOOGLE"] >= 70 or score["SPX"] >= 70:
         score["THAI_TAX"] = int(score["THAI_TAX"] * 0.25)
     elif score["SHOPEE"] >= 55 or score["LAZADA"] >= 55 or score["TIKTOK"] >= 55:
         score["THAI_TAX"] = int(score["THAI_TAX"] * 0.45)
+    yield "THAI_TAX", score["THAI_TAX"]
+
 
+def _weighted_score(t: str, fn: str) -> Dict[str, int]:
+    """All seven scores, in _SCORE_LABELS order."""
+    score = dict.fromkeys(_SCORE_LABELS, 0)
+    score.update(_iter_scores(t, fn))
     return score
 
 
-def classify_platform(text: str, filename: str = "", debug: bool = False) -> PlatformLabel:
+@dataclass(frozen=True, slots=True)
+class ClassifierInput:
+    """Text + filename already passed through _norm (build once, classify many times)."""
+    text_norm: str
+    filename_norm: str = ""
+
+    @classmethod
+    def from_raw(cls, text: str, filename: str = "") -> "ClassifierInput":
+        return cls(_norm(text), _norm(filename))
+
+
+def _normalized(text: str | ClassifierInput, filename: str) -> Tuple[str, str]:
+    if isinstance(text, ClassifierInput):
+        return text.text_norm, text.filename_norm
+    return _norm(text), _norm(filename)
+
+
+@lru_cache(maxsize=64)
+def _scores_cached(t: str, fn: str) -> Tuple[Tuple[str, int], ...]:
+    """_weighted_score memoized per (normalized text, filename); immutable copy."""
+    return tuple(_weighted_score(t, fn).items())
+
+
+@lru_cache(maxsize=64)
+def _scored_label(t: str, fn: str) -> PlatformLabel:
+    """_decide, but stops scoring at the first platform over its threshold."""
+    score = dict.fromkeys(_SCORE_LABELS, 0)
+    for label, value in _iter_scores(t, fn):
+        score[label] = value
+        if value >= _THRESHOLD_BY_LABEL[label]:
+            return label  # type: ignore[return-value]
+    return _decide(t, score)
+
+
+def _fast_path(t: str, fn: str) -> Optional[PlatformLabel]:
+    """Strong-ID shortcuts, in priority order (None -> use the weighted scores)."""
+    present = _present_needles(t)
+    if (
+        _regex_hit(t, RE_META_RECEIPT, present) or _regex_hit(fn, RE_META_RECEIPT) or
+        _regex_hit(t, RE_META_IRELAND, present) or _regex_hit(fn, RE_META_IRELAND)
+    ):
+        return "META"
+
+    if (
+        _regex_hit(t, RE_GOOGLE_PAYMENT, present) or _regex_hit(fn, RE_GOOGLE_PAYMENT) or
+        _regex_hit(t, RE_GOOGLE_ASIA, present) or _regex_hit(fn, RE_GOOGLE_ASIA)
+    ):
+        return "GOOGLE"
+
+    # SPX ก่อน Shopee เสมอ
+    if (
+        _regex_hit(t, RE_SPX_RCSPX, present) or _regex_hit(fn, RE_SPX_RCSPX) or
+        ("rcspx" in present) or ("rcspx" in fn)
+    ):
+        return "SPX"
+
+    if _regex_hit(t, RE_LAZADA_THMPTI, present) or _regex_hit(fn, RE_LAZADA_THMPTI):
+        return "LAZADA"
+
+    if _regex_hit(t, RE_TIKTOK_TTSTH, present) or _regex_hit(fn, RE_TIKTOK_TTSTH):
+        return "TIKTOK"
+
+    return None
+
+
+def _decide(t: str, score: Dict[str, int]) -> PlatformLabel:
+    """Thresholds + fallbacks over the weighted scores."""
+    best_label, best_score = max(score.items(), key=lambda kv: kv[1])
+
+    # thresholds per priority
+    for label, threshold in _THRESHOLDS:
+        if score[label] >= threshold:
+            return label  # type: ignore[return-value]
+
+    # modest fallback (only if reasonable)
+    if best_score >= 28 and best_label in (
+        "META", "GOOGLE", "SPX", "SHOPEE", "LAZADA", "TIKTOK", "THAI_TAX"
+    ):
+        return best_label  # type: ignore[return-value]
+
+    # invoice + vendor tax -> thai tax
+    if _contains_any(t, INVOICE_SIGS) and _has_vendor_tax_id(t):
+        return "THAI_TAX"
+
+    return "UNKNOWN"
+
+
+def classify_platform(
+    text: str | ClassifierInput, filename: str = "", debug: bool = False
+) -> PlatformLabel:
     """
     ✅ Enhanced platform classifier for 8 platforms
     - MUST accept filename
+    - text may be a ClassifierInput (filename is then ignored)
     """
     if debug:
         logger.setLevel(logging.DEBUG)
 
     try:
-        t = _norm(text)
-        fn = _norm(filename)
+        t, fn = _normalized(text, filename)
 
         if not t and not fn:
             return "UNKNOWN"
@@ -395,81 +590,33 @@ def classify_platform(text: str, filename: str = "", debug: bool = False) -> Pla
         # --------------------------
         # Fast paths (strong ID)
         # --------------------------
-        if (
-            _regex_hit(t, RE_META_RECEIPT) or _regex_hit(fn, RE_META_RECEIPT) or
-            _regex_hit(t, RE_META_IRELAND) or _regex_hit(fn, RE_META_IRELAND)
-        ):
-            return "META"
-
-        if (
-            _regex_hit(t, RE_GOOGLE_PAYMENT) or _regex_hit(fn, RE_GOOGLE_PAYMENT) or
-            _regex_hit(t, RE_GOOGLE_ASIA) or _regex_hit(fn, RE_GOOGLE_ASIA)
-        ):
-            return "GOOGLE"
-
-        # SPX ก่อน Shopee เสมอ
-        if (
-            _regex_hit(t, RE_SPX_RCSPX) or _regex_hit(fn, RE_SPX_RCSPX) or
-            ("rcspx" in t) or ("rcspx" in fn)
-        ):
-            return "SPX"
-
-        if _regex_hit(t, RE_LAZADA_THMPTI) or _regex_hit(fn, RE_LAZADA_THMPTI):
-            return "LAZADA"
-
-        if _regex_hit(t, RE_TIKTOK_TTSTH) or _regex_hit(fn, RE_TIKTOK_TTSTH):
-            return "TIKTOK"
+        label = _fast_path(t, fn)
+        if label:
+            return label
 
         # --------------------------
         # Weighted scoring
         # --------------------------
-        score = _weighted_score(t, filename=filename)
         if debug:
-            logger.debug("Scores: %s", score)
-
-        best_label, best_score = max(score.items(), key=lambda kv: kv[1])
-
-        # thresholds per priority
-        if score["META"] >= 55:
-            return "META"
-        if score["GOOGLE"] >= 55:
-            return "GOOGLE"
-        if score["SPX"] >= 45:
-            return "SPX"
-        if score["LAZADA"] >= 42:
-            return "LAZADA"
-        if score["TIKTOK"] >= 34:
-            return "TIKTOK"
-        if score["SHOPEE"] >= 34:
-            return "SHOPEE"
-        if score["THAI_TAX"] >= 70:
-            return "THAI_TAX"
-
-        # modest fallback (only if reasonable)
-        if best_score >= 28 and best_label in (
-            "META", "GOOGLE", "SPX", "SHOPEE", "LAZADA", "TIKTOK", "THAI_TAX"
-        ):
-            return best_label  # type: ignore[return-value]
-
-        # invoice + vendor tax -> thai tax
-        if _contains_any(t, INVOICE_SIGS) and _has_vendor_tax_id(t):
-            return "THAI_TAX"
+            logger.debug("Scores: %s", dict(_scores_cached(t, fn)))
 
-        return "UNKNOWN"
+        return _scored_label(t, fn)
 
     except Exception as e:
         logger.error("Classification error: %s", e, exc_info=True)
         return "UNKNOWN"
 
 
-def get_classification_details(text: str, filename: str = "") -> Tuple[PlatformLabel, Dict[str, int]]:
+def get_classification_details(
+    text: str | ClassifierInput, filename: str = ""
+) -> Tuple[PlatformLabel, Dict[str, int]]:
     """
     ✅ Return (platform, scores) for debugging
     """
     try:
-        t = _norm(text)
-        score = _weighted_score(t, filename=filename)
-        platform = classify_platform(text, filename, debug=False)
+        inp = text if isinstance(text, ClassifierInput) else ClassifierInput.from_raw(text, filename)
+        score = dict(_scores_cached(inp.text_norm, inp.filename_norm))
+        platform = classify_platform(inp, debug=False)
         return (platform, score)
     except Exception as e:
         logger.error("Error getting classification details: %s", e)
@@ -538,6 +685,7 @@ def get_platform_metadata(platform: PlatformLabel) -> Dict[str, str]:
 
 __all__ = [
     "PlatformLabel",
+    "ClassifierInput",
     "classify_platform",
     "get_classification_details",
     "get_platform_metadata",
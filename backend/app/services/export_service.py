@@ -28,7 +28,7 @@ import os
 import re
 import logging
 from decimal import Decimal, InvalidOperation
-from typing import List, Dict, Any, Tuple, Optional, Set
+from typing import List, Dict, Any, Tuple, Optional, Set, FrozenSet
 
 from openpyxl import Workbook
 from openpyxl.styles import Alignment, Font, PatternFill, Border, Side, numbers
@@ -120,16 +120,16 @@ NUM_COL_KEYS: Set[str] = {"M_qty", "N_unit_price", "R_paid_amount"}
 DATE_COL_KEYS: Set[str] = {"B_doc_date", "H_invoice_date", "I_tax_purchase_date"}
 
 # Excel injection prevention
-EXCEL_INJECTION_PREFIXES = ("=", "+", "-", "@")
+EXCEL_INJECTION_PREFIXES: FrozenSet[str] = frozenset("=+-@")
 
 # Regex patterns
-RE_YYYYMMDD = re.compile(r"^\d{8}$")
-RE_YYYY_MM_DD = re.compile(r"^(\d{4})-(\d{1,2})-(\d{1,2})$")
-RE_DD_MM_YYYY = re.compile(r"^(\d{1,2})/(\d{1,2})/(\d{4})$")
-RE_YYYY_SLASH_MM_DD = re.compile(r"^(\d{4})/(\d{1,2})/(\d{1,2})$")
-RE_EURO_DD_MM_YYYY = re.compile(r"^(\d{1,2})-(\d{1,2})-(\d{4})$")
+# YYYYMMDD | YYYY-MM-DD | YYYY/MM/DD | DD/MM/YYYY | DD-MM-YYYY (same separator twice)
+RE_DATE = re.compile(
+    r"^(?:(?P<ymd>\d{8})"
+    r"|(?P<y1>\d{4})(?P<s1>[-/])(?P<m1>\d{1,2})(?P=s1)(?P<d1>\d{1,2})"
+    r"|(?P<d2>\d{1,2})(?P<s2>[-/])(?P<m2>\d{1,2})(?P=s2)(?P<y2>\d{4}))$"
+)
 
-RE_ALL_WS = re.compile(r"\s+")
 MAX_ROWS = 50000
 MAX_CELL_LENGTH = 32767
 
@@ -154,7 +154,7 @@ def _compact_no_ws(v: Any) -> str:
     if not s:
         return ""
     try:
-        return RE_ALL_WS.sub("", s)
+        return "".join(s.split())
     except Exception:
         return s
 
@@ -244,7 +244,7 @@ def _escape_excel_formula(s: str) -> str:
     if not s:
         return s
     try:
-        if s[:1] in EXCEL_INJECTION_PREFIXES:
+        if s[0] in EXCEL_INJECTION_PREFIXES:
             return "'" + s
         return s
     except Exception:
@@ -255,36 +255,15 @@ def _parse_date_to_yyyymmdd(date_str: Any) -> str:
         return ""
     s = _s(date_str)
 
-    if RE_YYYYMMDD.match(s):
-        return s
-
-    m = RE_YYYY_MM_DD.match(s)
-    if m:
-        yyyy = m.group(1)
-        mm = m.group(2).zfill(2)
-        dd = m.group(3).zfill(2)
-        return f"{yyyy}{mm}{dd}"
-
-    m = RE_DD_MM_YYYY.match(s)
+    m = RE_DATE.match(s)
     if m:
-        dd = m.group(1).zfill(2)
-        mm = m.group(2).zfill(2)
-        yyyy = m.group(3)
-        return f"{yyyy}{mm}{dd}"
-
-    m = RE_YYYY_SLASH_MM_DD.match(s)
-    if m:
-        yyyy = m.group(1)
-        mm = m.group(2).zfill(2)
-        dd = m.group(3).zfill(2)
-        return f"{yyyy}{mm}{dd}"
-
-    m = RE_EURO_DD_MM_YYYY.match(s)
-    if m:
-        dd = m.group(1).zfill(2)
-        mm = m.group(2).zfill(2)
-        yyyy = m.group(3)
-        return f"{yyyy}{mm}{dd}"
+        if m.lastgroup == "ymd":
+            return s
+        if m.lastgroup == "d1":
+            yyyy, mm, dd = m.group("y1", "m1", "d1")
+        else:
+            dd, mm, yyyy = m.group("d2", "m2", "y2")
+        return f"{yyyy}{mm.zfill(2)}{dd.zfill(2)}"
 
     try:
         from datetime import datetime
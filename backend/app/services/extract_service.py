@@ -154,7 +154,6 @@ PEAK_KEYS_ORDER: List[str] = [
 _AI_BLACKLIST_KEYS = {"T_note", "U_group", "K_account"}
 _INTERNAL_OK_PREFIXES = ("_",)
 
-_RE_ALL_WS = re.compile(r"\s+")
 
 # ============================================================
 # Reference normalizer (ตัด Shopee-TIV- ให้เหลือ TRS...)
@@ -187,7 +186,7 @@ def _compact_no_ws(v: Any) -> str:
     s = s.strip()
     if not s:
         return ""
-    return _RE_ALL_WS.sub("", s)
+    return "".join(s.split())
 
 
 def _normalize_reference_core(value: Any) -> str:
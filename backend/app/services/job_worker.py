@@ -66,7 +66,6 @@ ACCOUNT_BY_CLIENT_TAX_ID: Dict[str, str] = {
 # Regex / helpers
 # ============================================================
 
-RE_ALL_WS = re.compile(r"\s+")
 RE_SELLER_ID_HINTS = [
     re.compile(
         r"\b(?:seller_id|seller\s*id|shop_id|shop\s*id|merchant_id|merchant\s*id)\b\D{0,20}(\d{5,20})",
@@ -101,7 +100,7 @@ def _clean_money_str(v: Any) -> str:
     if not s:
         return ""
     s = s.replace("฿", "").replace("THB", "").replace(",", "").strip()
-    s = RE_ALL_WS.sub("", s)
+    s = "".join(s.split())
     return s
 
 
@@ -109,7 +108,7 @@ def _compact_ref(v: Any) -> str:
     s = _safe_str(v)
     if not s:
         return ""
-    return RE_ALL_WS.sub("", s)
+    return "".join(s.split())
 
 
 def _filename_base(filename: str) -> str:
@@ -827,10 +826,15 @@ def process_job_files(job_service, job_id: str) -> None:
                         "U_group",
                     ]
 
+                    partial_row = {k: row.get(k, "") for k in partial_keys}
+                    if row.get("_errors"):
+                        # rows sent because of errors: AI must not skip / keep the rule-based values
+                        partial_row["_errors"] = list(row["_errors"])
+
                     ai_patch = ai_fill_peak_row(
                         text=text,
                         platform_hint=platform_u,
-                        partial_row={k: row.get(k, "") for k in partial_keys},
+                        partial_row=partial_row,
                         source_filename=filename,
                     )
 
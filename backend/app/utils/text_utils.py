@@ -34,7 +34,6 @@ THAI_TO_ARABIC = str.maketrans(THAI_DIGITS, ARABIC_DIGITS)
 _DASH_CHARS = "\u2010\u2011\u2012\u2013\u2014\u2212\uFE63\uFF0D\u0E3F"
 RE_DASHES = re.compile(rf"[{_DASH_CHARS}]+")
 RE_MULTI_SPACE = re.compile(r"[ \t]+")
-RE_ALL_WS = re.compile(r"\s+")
 
 # Zero-width / control chars that often appear from PDF extract / OCR
 RE_CONTROL = re.compile(r"[\x00-\x08\x0B\x0C\x0E-\x1F]")
@@ -134,7 +133,7 @@ def compact_no_ws(text: Optional[str]) -> str:
     if not text:
         return ""
     s = _normalize_punct(str(text))
-    s = RE_ALL_WS.sub("", s)
+    s = "".join(s.split())
     return s.strip()
 
 